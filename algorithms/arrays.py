@@ -0,0 +1,106 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Any, Iterator, Optional, Tuple
+
+# Vectorized bulk builders for the stacks whose square ``n`` is derived from
+# square ``n // 2`` (erdos and rational).  NumPy is an optional dependency:
+# it is only imported when one of the ``build_array`` paths is used.
+
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError as exc:  # pragma: no cover - depends on environment
+        raise ImportError(
+            "build_array needs NumPy; install it with 'pip install numpy'"
+        ) from exc
+    return numpy
+
+
+@dataclass
+class SquareArrays:
+    """Squares ``1..count`` as parallel arrays, indexed by ``n - 1``.
+
+    In float mode ``x``, ``y`` and ``side`` are float64 arrays and ``den`` is
+    ``None``.  In exact mode ``x`` and ``y`` are object arrays of integer
+    numerators over the per-square denominators in ``den`` (reduced so that
+    ``gcd(x, y, den) == 1``) and ``side`` is ``None``; the side of square
+    ``n`` is exactly ``1/n``.
+    """
+
+    n: Any
+    x: Any
+    y: Any
+    side: Optional[Any] = None
+    den: Optional[Any] = None
+    direction: Optional[Any] = None  # rational only: 0 = right, 1 = up
+    parent: Optional[Any] = None  # rational only; 0 for the 1-square
+
+    @property
+    def exact(self) -> bool:
+        return self.den is not None
+
+    def __len__(self) -> int:
+        return len(self.n)
+
+    def rows(self) -> Iterator[Tuple[int, Any, Any, Any]]:
+        """Yield ``(n, x, y, side)`` per square, as Fractions in exact mode."""
+        if self.exact:
+            for n, x, y, d in zip(self.n.tolist(), self.x, self.y, self.den):
+                yield n, Fraction(x, d), Fraction(y, d), Fraction(1, n)
+        else:
+            yield from zip(
+                self.n.tolist(), self.x.tolist(), self.y.tolist(), self.side.tolist()
+            )
+
+
+def levels(count: int) -> Iterator[Tuple[int, int]]:
+    """Yield ``(start, stop)`` ranges of ``n`` sharing a bit length."""
+    start = 2
+    while start <= count:
+        yield start, min(2 * start, count + 1)
+        start *= 2
+
+
+def empty(np, count: int, exact: bool):
+    """Allocate coordinate arrays for squares ``1..count`` at the origin."""
+    n = np.arange(1, count + 1, dtype=np.int64)
+    if exact:
+        zeros = np.zeros(count, dtype=object)
+        x = zeros.copy()
+        y = zeros.copy()
+        den = np.ones(count, dtype=object)
+        # object arrays filled by ``np.zeros``/``np.ones`` hold Python ints
+        return n, x, y, None, den
+    x = np.zeros(count, dtype=np.float64)
+    y = np.zeros(count, dtype=np.float64)
+    side = 1.0 / n
+    return n, x, y, side, None
+
+
+def step(np, x, y, den, ns, parents, right, exact: bool):
+    """Place squares ``ns`` one parent side right (``right``) or up of ``parents``.
+
+    ``right`` is a boolean mask over ``ns``.  ``x``/``y``/``den`` are updated in
+    place at indices ``ns - 1``.
+    """
+    pi = parents - 1
+    ci = ns - 1
+    if not exact:
+        inv = 1.0 / parents
+        x[ci] = x[pi] + np.where(right, inv, 0.0)
+        y[ci] = y[pi] + np.where(right, 0.0, inv)
+        return
+    p = parents.astype(object)
+    d = den[pi]
+    # x/d + 1/p == (x*p + d) / (d*p)
+    xn = x[pi] * p
+    yn = y[pi] * p
+    xn = np.where(right, xn + d, xn)
+    yn = np.where(right, yn, yn + d)
+    dn = d * p
+    g = np.gcd(np.gcd(xn, yn), dn)
+    x[ci] = xn // g
+    y[ci] = yn // g
+    den[ci] = dn // g
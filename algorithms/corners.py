@@ -0,0 +1,189 @@
+from __future__ import annotations
+from fractions import Fraction
+from random import Random
+from typing import Callable, Iterator, Optional, Tuple
+
+# An ordered sequence of corners backed by an implicit treap.  Each node keeps
+# the largest square any corner of its subtree has room for (the largest
+# ``min(vspan, hspan)``, with an unbounded ``hspan`` counting as ``vspan``)
+# and the lowest ``bottom`` found in its subtree, so that a first-fit search
+# can skip whole runs of corners that are too small (or too high) for the
+# square being placed.  Corners keep their
+# list order; positions are implicit in the subtree sizes.
+
+
+class _Node:
+    __slots__ = (
+        "corner",
+        "priority",
+        "size",
+        "left",
+        "right",
+        "max_room",
+        "min_bottom",
+    )
+
+    def __init__(self, corner, priority: float) -> None:
+        self.corner = corner
+        self.priority = priority
+        self.left: Optional[_Node] = None
+        self.right: Optional[_Node] = None
+        self._update()
+
+    def _update(self) -> None:
+        c = self.corner
+        size = 1
+        # ``None`` marks an unbounded horizontal span.
+        if c.hspan is None or c.vspan < c.hspan:
+            max_room = c.vspan
+        else:
+            max_room = c.hspan
+        min_bottom = c.bottom
+        for child in (self.left, self.right):
+            if child is None:
+                continue
+            size += child.size
+            if child.max_room > max_room:
+                max_room = child.max_room
+            if child.min_bottom < min_bottom:
+                min_bottom = child.min_bottom
+        self.size = size
+        self.max_room = max_room
+        self.min_bottom = min_bottom
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node is not None else 0
+
+
+def _merge(a: Optional[_Node], b: Optional[_Node]) -> Optional[_Node]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        a.right = _merge(a.right, b)
+        a._update()
+        return a
+    b.left = _merge(a, b.left)
+    b._update()
+    return b
+
+
+def _split(
+    node: Optional[_Node], k: int
+) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Split ``node`` into its first ``k`` corners and the rest."""
+    if node is None:
+        return None, None
+    if _size(node.left) >= k:
+        left, node.left = _split(node.left, k)
+        node._update()
+        return left, node
+    node.right, right = _split(node.right, k - _size(node.left) - 1)
+    node._update()
+    return node, right
+
+
+class CornerIndex:
+    """Ordered corner list with pruned first-fit queries.
+
+    Only the room aggregate and the lowest bottom are used to prune, so a
+    query can still walk a subtree whose roomy corner sits too high; in
+    practice the corners scanned per square grow roughly logarithmically.
+    """
+
+    def __init__(self, corners=(), seed: int = 0) -> None:
+        self._random = Random(seed)
+        self._root: Optional[_Node] = None
+        for c in corners:
+            self._root = _merge(self._root, self._node(c))
+
+    def _node(self, corner) -> _Node:
+        return _Node(corner, self._random.random())
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def __iter__(self) -> Iterator:
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.corner
+            node = node.right
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("corner index out of range")
+        node = self._root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.corner
+            else:
+                index -= left + 1
+                node = node.right
+
+    def find(
+        self, side: Fraction, ceiling: Fraction, closed: bool, fits: Callable
+    ) -> Tuple[int, object]:
+        """Return ``(index, corner)`` of the first corner accepted by ``fits``.
+
+        Subtrees where no corner has room for ``side`` or whose lowest corner
+        lies above ``ceiling`` (or on it unless ``closed``) are skipped without
+        visiting their corners.
+        """
+        found = self._find(self._root, side, ceiling, closed, fits, 0)
+        if found is None:
+            raise RuntimeError("no position found")
+        return found
+
+    def _find(self, node, side, ceiling, closed, fits, offset):
+        if node is None:
+            return None
+        if node.max_room < side:
+            return None
+        if closed:
+            if node.min_bottom > ceiling:
+                return None
+        elif node.min_bottom >= ceiling:
+            return None
+        found = self._find(node.left, side, ceiling, closed, fits, offset)
+        if found is not None:
+            return found
+        index = offset + _size(node.left)
+        if fits(node.corner):
+            return index, node.corner
+        return self._find(node.right, side, ceiling, closed, fits, index + 1)
+
+    def rescale(self, factor: int) -> None:
+        """Multiply every corner coordinate and span by ``factor``."""
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            c = node.corner
+            c.x *= factor
+            c.bottom *= factor
+            c.vspan *= factor
+            if c.hspan is not None:
+                c.hspan *= factor
+            node.max_room *= factor
+            node.min_bottom *= factor
+            pending.extend(n for n in (node.left, node.right) if n is not None)
+
+    def replace(self, index: int, corners) -> None:
+        """Replace the corner at ``index`` with ``corners`` in order."""
+        left, rest = _split(self._root, index)
+        _, right = _split(rest, 1)
+        middle = None
+        for c in corners:
+            middle = _merge(middle, self._node(c))
+        self._root = _merge(_merge(left, middle), right)
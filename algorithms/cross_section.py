@@ -0,0 +1,122 @@
+from __future__ import annotations
+from bisect import bisect_right
+from fractions import Fraction
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# The cross-section function of docs/todo.md item 6: f(a) is the total
+# horizontal length of the stack at height y = a.  A square covers the
+# heights ``bottom <= a < top``, so f is a step function that only changes at
+# square bottoms and tops.
+
+
+class CrossSection:
+    """Exact step function ``f(a)`` for a set of squares.
+
+    The squares' bottom and top events are merged and sorted once; after that
+    ``f(a)`` is a binary search and ``evaluate`` answers a sorted batch of
+    heights in one merge sweep, for ``O((n + m) log n)`` overall.
+    """
+
+    def __init__(self, squares: Iterable) -> None:
+        deltas: Dict[Fraction, Fraction] = {}
+        for b in squares:
+            top = b.y + b.side
+            deltas[b.y] = deltas.get(b.y, 0) + b.side
+            deltas[top] = deltas.get(top, 0) - b.side
+        # ``heights[i]`` starts a step on which f equals ``values[i]``
+        self.heights: List[Fraction] = []
+        self.values: List[Fraction] = []
+        value = Fraction(0)
+        for height in sorted(deltas):
+            delta = deltas[height]
+            if delta == 0:
+                continue
+            value += delta
+            self.heights.append(height)
+            self.values.append(value)
+
+    def __call__(self, a) -> Fraction:
+        i = bisect_right(self.heights, a)
+        return self.values[i - 1] if i else Fraction(0)
+
+    def evaluate(self, heights: Sequence) -> List[Fraction]:
+        """``f`` at each of ``heights``, which must be sorted ascending."""
+        result: List[Fraction] = []
+        steps = self.heights
+        values = self.values
+        i = 0
+        value = Fraction(0)
+        previous = None
+        for a in heights:
+            if previous is not None and a < previous:
+                raise ValueError("heights must be sorted in ascending order")
+            previous = a
+            while i < len(steps) and steps[i] <= a:
+                value = values[i]
+                i += 1
+            result.append(value)
+        return result
+
+    def breakpoints(self) -> List[Tuple[Fraction, Fraction]]:
+        """``(a, f(a))`` at every height where ``f`` changes; ``f`` keeps that
+        value up to the next breakpoint and is 0 below the first."""
+        return list(zip(self.heights, self.values))
+
+    def samples(
+        self, count: int, low: Fraction = Fraction(0), high: Optional[Fraction] = None
+    ) -> List[Tuple[Fraction, Fraction]]:
+        """``count`` evenly spaced ``(a, f(a))`` pairs on ``[low, high)``
+        (``high`` defaults to the top of the highest square)."""
+        if count <= 0:
+            raise ValueError("count must be positive")
+        if high is None:
+            high = self.heights[-1] if self.heights else Fraction(1)
+        step = (high - low) / count
+        heights = [low + k * step for k in range(count)]
+        return list(zip(heights, self.evaluate(heights)))
+
+    def write_samples(
+        self, path: str, points: Iterable[Tuple[Fraction, Fraction]], exact: bool = False
+    ) -> None:
+        """Write ``a,f`` rows as CSV, as floats or (``exact``) as fractions."""
+        fmt = str if exact else (lambda v: repr(float(v)))
+        with open(path, "w") as fh:
+            fh.write("a,f\n")
+            for a, value in points:
+                fh.write(f"{fmt(a)},{fmt(value)}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+    import importlib
+
+    parser = argparse.ArgumentParser(
+        description="Sample the cross-section length f(a) of a square stack"
+    )
+    parser.add_argument("N", type=int, nargs="?", default=1000, help="number of squares")
+    parser.add_argument(
+        "--algo",
+        default="sylvester",
+        help="stacking algorithm (module name in algorithms)",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=1000,
+        help="evenly spaced heights to sample (0 writes the breakpoints)",
+    )
+    parser.add_argument("--exact", action="store_true", help="write exact fractions")
+    parser.add_argument("--output", default="cross_section.csv", help="CSV file to write")
+    args = parser.parse_args()
+    if args.samples < 0:
+        parser.error("--samples must not be negative")
+
+    module = importlib.import_module(f"algorithms.{args.algo}")
+    stack = module.Stack()
+    stack.build(args.N)
+    section = CrossSection(stack.squares)
+    if args.samples:
+        points = section.samples(args.samples)
+    else:
+        points = section.breakpoints()
+    section.write_samples(args.output, points, exact=args.exact)
@@ -1,7 +1,15 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from fractions import Fraction
-from typing import List
+
+from .arrays import SquareArrays, empty, levels, require_numpy, step
+from .lazy import AncestorCache, LazySquares
+from .numeric import backend
+from .store import SquareStore, StoredSquares
+
+# Every square lies inside [0, 2] x [0, E], where E = 1.60669... is the
+# Erdos-Borwein constant traced by the left edge; 1607/1000 bounds it above.
+EXTENT = (Fraction(2), Fraction(1607, 1000))
 
 @dataclass
 class Square:
@@ -10,37 +18,83 @@ class Square:
     x: Fraction
     y: Fraction  # bottom coordinate
 
-class Stack:
-    """Construct the square stack using the Erdos method."""
+class Stack(StoredSquares, LazySquares):
+    """Construct the square stack using the Erdos method.
+
+    Besides ``build``, any square can be read directly as ``stack[n]`` (or a
+    range as ``stack[a:b]``) without building squares ``1..n-1``, and
+    ``iter_view`` generates only the squares of a viewport above a size."""
+
+    _ROOT = (Fraction(0), Fraction(0))
 
-    def __init__(self, strict: bool = True) -> None:
+    def __init__(self, strict: bool = True, numeric: str = "exact") -> None:
         # ``strict`` is accepted for API compatibility but ignored.
-        self.squares: List[Square] = [
-            Square(1, Fraction(1), Fraction(0), Fraction(0))
-        ]
+        # ``numeric`` selects the arithmetic used to sum the position
+        # (see ``algorithms.numeric``); positions are always exact.
+        self.numeric = numeric
+        self._num = backend(numeric)
+        self.squares = SquareStore(Square)
+        self.squares.add(1, Fraction(0), Fraction(0))
+        self._ancestors = AncestorCache(self._ROOT, self._child_position)
+
+    @staticmethod
+    def _child_position(
+        parent: tuple[Fraction, Fraction], n: int
+    ) -> tuple[Fraction, Fraction]:
+        # square n sits one side of square n // 2 to the right (n even) or
+        # above it (n odd)
+        x, y = parent
+        if n % 2 == 0:
+            return x + Fraction(1, n // 2), y
+        return x, y + Fraction(1, n // 2)
+
+    @staticmethod
+    def _from_state(n: int, state: tuple[Fraction, Fraction]) -> Square:
+        x, y = state
+        return Square(n, Fraction(1, n), x, y)
+
+    def _square(self, n: int) -> Square:
+        if n <= len(self.squares):
+            return self.squares[n - 1]
+        return self._from_state(n, self._ancestors(n))
 
     def _position(self, n: int) -> tuple[Fraction, Fraction]:
         if n == 1:
             return Fraction(0), Fraction(0)
-        x = Fraction(0)
-        y = Fraction(0)
+        num = self._num
+        # positions are recomputed from scratch, so there is no stored
+        # state to rescale when the shared denominator grows
+        num.grow(n)
+        x = num.zero
+        y = num.zero
         prefix = 1
         bits = bin(n)[3:]  # drop '0b1'
         for b in bits:
             if b == '0':
-                x += Fraction(1, prefix)
+                x += num.side(prefix)
             else:
-                y += Fraction(1, prefix)
+                y += num.side(prefix)
             prefix = prefix * 2 + int(b)
-        return x, y
+        return num.exact(x), num.exact(y)
 
     def add_square(self, n: int) -> None:
         x, y = self._position(n)
-        self.squares.append(Square(n, Fraction(1, n), x, y))
+        self.squares.add(n, x, y)
 
-    def build(self, count: int) -> None:
-        for n in range(2, count + 1):
-            self.add_square(n)
+    def build_array(self, count: int, exact: bool = False) -> SquareArrays:
+        """Return squares ``1..count`` as NumPy arrays (requires NumPy).
+
+        Square ``n`` sits one side of square ``n // 2`` to the right when the
+        last bit of ``n`` is 0 and above it otherwise, so each bit level is a
+        single vectorized step.  ``exact=True`` keeps integer numerators and
+        denominators instead of float64.  ``self.squares`` is not touched.
+        """
+        np = require_numpy()
+        n, x, y, side, den = empty(np, count, exact)
+        for start, stop in levels(count):
+            ns = n[start - 1:stop - 1]
+            step(np, x, y, den, ns, ns >> 1, (ns & 1) == 0, exact)
+        return SquareArrays(n, x, y, side, den)
 
     def summary(self) -> str:
         lines = []
@@ -49,3 +103,45 @@ class Stack:
                 f"n={b.n}: left={b.x} bottom={b.y} side={b.side}"
             )
         return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .export import add_arguments, export
+    from . import stats
+
+    parser = argparse.ArgumentParser(description="Construct the Erdos square stack")
+    parser.add_argument("N", type=int, nargs="?", default=10, help="number of squares to place")
+    parser.add_argument(
+        "--numeric",
+        choices=["exact", "float", "integer"],
+        default="exact",
+        help="arithmetic for summing positions (results are identical)",
+    )
+    parser.add_argument(
+        "--view",
+        nargs=4,
+        type=Fraction,
+        metavar=("X0", "Y0", "X1", "Y1"),
+        help="only generate squares overlapping this box, down to side 1/N",
+    )
+    parser.add_argument(
+        "--min-side",
+        type=Fraction,
+        help="smallest side generated with --view (default: 1/N)",
+    )
+    add_arguments(parser)
+    stats.add_arguments(parser)
+    args = parser.parse_args()
+
+    stack = Stack(numeric=args.numeric)
+    if args.view is not None:
+        min_side = args.min_side or Fraction(1, args.N)
+        export(stack.iter_view(*args.view, min_side), args.output, args.format, args.digits)
+    else:
+        if stats.requested(args):
+            stack.profile()
+        stack.build(args.N)
+        export(stack, args.output, args.format, args.digits)
+        stats.emit(stack.stats, args.profile_json)
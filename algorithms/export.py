@@ -0,0 +1,233 @@
+from __future__ import annotations
+import struct
+import sys
+from fractions import Fraction
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from .persist import LENGTHS, write_fraction
+
+# Streaming export of placements.  Squares are read as ``(n, x, y)`` triples
+# (straight from the ``SquareStore`` columns when possible), formatted a batch
+# at a time and written through one large buffer, so the output never exists
+# as a single string.
+#
+# Formats:
+#
+#   summary  the ``n=.. left=.. bottom=.. side=..`` lines of ``summary()``
+#   csv      ``n,x,y`` with a header row
+#   jsonl    one ``{"n": .., "x": .., "y": ..}`` object per line
+#   binary   magic ``BASELEXP``, u32 version, u32 flags, then one record per
+#            square: int64 ``n`` followed by ``x`` and ``y``.  With flag bit 0
+#            set the coordinates are exact, each written like a heap value of
+#            ``algorithms.persist`` (two u32 byte lengths, then the signed
+#            little-endian numerator and denominator); otherwise they are two
+#            float64s and every record is 24 bytes.
+#
+# Coordinates are exact ``num/den`` by default.  With ``digits`` they are
+# rounded to that many decimal places using integer arithmetic; in
+# JSONL they are then plain JSON numbers instead of strings.  The side of
+# square ``n`` is always ``1/n`` and is only written by ``summary``.
+
+FORMATS = ("summary", "csv", "jsonl", "binary")
+MAGIC = b"BASELEXP"
+VERSION = 1
+EXACT = 1
+_PREFIX = struct.Struct("<8sII")
+_INT64 = struct.Struct("<q")
+_FLOAT_RECORD = struct.Struct("<qdd")
+
+Placement = Tuple[int, Fraction, Fraction]
+
+
+def placements(source) -> Iterator[Placement]:
+    """``(n, x, y)`` for every square of a stack, ``SquareStore`` or iterable
+    of squares, reading store columns directly where there are any."""
+    squares = getattr(source, "squares", source)
+    if hasattr(squares, "n") and hasattr(squares, "x"):
+        return zip(squares.n, squares.x, squares.y)
+    return ((b.n, b.x, b.y) for b in squares)
+
+
+def exact_strings(values: Iterable[Fraction]) -> List[str]:
+    """``str(value)`` for a batch of Fractions, without ``Fraction.__str__``."""
+    result = []
+    append = result.append
+    for v in values:
+        num = v.numerator
+        den = v.denominator
+        append(str(num) if den == 1 else f"{num}/{den}")
+    return result
+
+
+def decimal_strings(values: Iterable[Fraction], digits: int) -> List[str]:
+    """A batch of Fractions rounded to ``digits`` decimal places (ties away
+    from zero).
+
+    One power of ten is shared by the whole batch and each value costs a
+    multiplication, an integer division and some slicing.
+    """
+    return decimal_ratios(((v.numerator, v.denominator) for v in values), digits)
+
+
+def decimal_ratios(pairs: Iterable[Tuple[int, int]], digits: int) -> List[str]:
+    """``decimal_strings`` for ``(numerator, denominator)`` pairs with a
+    positive denominator, which need not be in lowest terms."""
+    scale = 10 ** digits
+    result = []
+    append = result.append
+    for num, den in pairs:
+        sign = ""
+        if num < 0:
+            sign = "-"
+            num = -num
+        q = (2 * num * scale + den) // (2 * den)
+        if digits == 0:
+            append(f"{sign}{q}")
+            continue
+        s = str(q)
+        if len(s) <= digits:
+            s = "0" * (digits + 1 - len(s)) + s
+        append(f"{sign}{s[:-digits]}.{s[-digits:]}")
+    return result
+
+
+def _side_strings(ns: Iterable[int]) -> List[str]:
+    return ["1" if n == 1 else f"1/{n}" for n in ns]
+
+
+def _format_text(
+    batch: List[Placement], fmt: str, digits: Optional[int]
+) -> str:
+    ns = [n for n, _, _ in batch]
+    if digits is None:
+        xs = exact_strings(x for _, x, _ in batch)
+        ys = exact_strings(y for _, _, y in batch)
+    else:
+        xs = decimal_strings((x for _, x, _ in batch), digits)
+        ys = decimal_strings((y for _, _, y in batch), digits)
+    if fmt == "summary":
+        sides = _side_strings(ns)
+        lines = [
+            f"n={n}: left={x} bottom={y} side={side}"
+            for n, x, y, side in zip(ns, xs, ys, sides)
+        ]
+    elif fmt == "csv":
+        lines = [f"{n},{x},{y}" for n, x, y in zip(ns, xs, ys)]
+    elif digits is None:
+        lines = ['{"n": %d, "x": "%s", "y": "%s"}' % row for row in zip(ns, xs, ys)]
+    else:
+        lines = ['{"n": %d, "x": %s, "y": %s}' % row for row in zip(ns, xs, ys)]
+    return "\n".join(lines)
+
+
+def _format_binary(batch: List[Placement], exact: bool) -> bytes:
+    if not exact:
+        pack = _FLOAT_RECORD.pack
+        return b"".join(pack(n, float(x), float(y)) for n, x, y in batch)
+    out = bytearray()
+    pack = _INT64.pack
+    for n, x, y in batch:
+        out += pack(n)
+        write_fraction(out, x)
+        write_fraction(out, y)
+    return bytes(out)
+
+
+def write(
+    rows: Iterable[Placement],
+    fh: BinaryIO,
+    fmt: str = "csv",
+    digits: Optional[int] = None,
+    batch: int = 4096,
+) -> int:
+    """Write ``rows`` to the binary file ``fh`` in ``fmt``; returns the count.
+
+    ``digits`` selects fixed-precision decimals (float64 for ``binary``)
+    instead of exact fractions.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; choose from {FORMATS}")
+    if fmt == "binary":
+        exact = digits is None
+        fh.write(_PREFIX.pack(MAGIC, VERSION, EXACT if exact else 0))
+    elif fmt == "csv":
+        fh.write(b"n,x,y\n")
+    count = 0
+    rows = iter(rows)
+    while True:
+        pending = [row for _, row in zip(range(batch), rows)]
+        if not pending:
+            break
+        count += len(pending)
+        if fmt == "binary":
+            fh.write(_format_binary(pending, exact))
+        else:
+            fh.write(_format_text(pending, fmt, digits).encode("ascii"))
+            fh.write(b"\n")
+    return count
+
+
+def export(
+    source,
+    path: Optional[str] = None,
+    fmt: str = "csv",
+    digits: Optional[int] = None,
+    buffering: int = 1 << 20,
+) -> int:
+    """Write the squares of ``source`` (see ``placements``) to ``path``, or to
+    standard output if ``path`` is ``None``.  Returns the number written."""
+    rows = placements(source)
+    if path is None:
+        count = write(rows, sys.stdout.buffer, fmt, digits)
+        sys.stdout.buffer.flush()
+        return count
+    with open(path, "wb", buffering=buffering) as fh:
+        return write(rows, fh, fmt, digits)
+
+
+def add_arguments(parser) -> None:
+    """The ``--format``, ``--digits`` and ``--output`` options of the module
+    entry points."""
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="summary",
+        help="output format (default: summary)",
+    )
+    parser.add_argument(
+        "--digits",
+        type=int,
+        help="write coordinates rounded to this many decimals instead of exactly "
+        "(float64 for binary)",
+    )
+    parser.add_argument("--output", help="file to write (default: standard output)")
+
+
+def read_binary(fh: BinaryIO) -> Iterator[Placement]:
+    """Placements from a file written with ``fmt="binary"``."""
+    magic, version, flags = _PREFIX.unpack(fh.read(_PREFIX.size))
+    if magic != MAGIC:
+        raise ValueError("not a placement export (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"unsupported export version {version}")
+    if not flags & EXACT:
+        while True:
+            data = fh.read(_FLOAT_RECORD.size * 4096)
+            if not data:
+                return
+            yield from _FLOAT_RECORD.iter_unpack(data)
+
+    def fraction() -> Fraction:
+        num_len, den_len = LENGTHS.unpack(fh.read(LENGTHS.size))
+        num = int.from_bytes(fh.read(num_len), "little", signed=True)
+        den = int.from_bytes(fh.read(den_len), "little", signed=True)
+        return Fraction(num, den)
+
+    while True:
+        data = fh.read(_INT64.size)
+        if not data:
+            return
+        (n,) = _INT64.unpack(data)
+        x = fraction()
+        y = fraction()
+        yield n, x, y
@@ -0,0 +1,122 @@
+from __future__ import annotations
+from collections import OrderedDict
+from fractions import Fraction
+from math import floor
+from typing import Any, Callable, Iterator, Optional
+
+
+class AncestorCache:
+    """Derive per-square state along the chain ``n -> n // 2 -> ... -> 1``.
+
+    ``child(state, n)`` returns the state of square ``n`` from the state of its
+    parent ``n // 2``.  Recently computed states are kept in a bounded LRU
+    memo, so neighbouring squares share most of their ancestor chain and
+    memory stays independent of ``n``.
+    """
+
+    def __init__(
+        self, root: Any, child: Callable[[Any, int], Any], maxsize: int = 4096
+    ) -> None:
+        self._root = root
+        self._child = child
+        self._maxsize = maxsize
+        self._memo: OrderedDict[int, Any] = OrderedDict()
+
+    def __call__(self, n: int) -> Any:
+        memo = self._memo
+        path = []
+        m = n
+        while m > 1 and m not in memo:
+            path.append(m)
+            m //= 2
+        if m > 1:
+            memo.move_to_end(m)
+            state = memo[m]
+        else:
+            state = self._root
+        for m in reversed(path):
+            state = self._child(state, m)
+            memo[m] = state
+        while len(memo) > self._maxsize:
+            memo.popitem(last=False)
+        return state
+
+
+class LazySquares:
+    """Random access to squares by number without building the stack.
+
+    Subclasses must provide ``_square(n)``, which returns the n-square; there
+    is no default.  ``stack[n]`` returns it, ``stack[a:b:c]`` a list of the
+    squares numbered ``range(a, b, c)``, and ``iter_range`` walks squares
+    lazily.  The squares never run out, so a
+    stack is deliberately not iterable: ``for square in stack`` raises
+    ``TypeError`` instead of looping forever (``stack.squares`` holds the
+    squares built so far).
+
+    Subclasses whose squares form the binary tree ``n -> 2n, 2n + 1`` also
+    provide ``_ROOT``, the state of the 1-square, ``_child_position(state,
+    n)`` as for ``AncestorCache`` (states start with ``x, y``) and
+    ``_from_state(n, state)``; ``iter_view`` then walks that tree.
+    """
+
+    def iter_view(self, x0, y0, x1, y1, min_side) -> Iterator:
+        """Yield the squares overlapping ``[x0, x1] x [y0, y1]`` with side at
+        least ``min_side``, in order of ``n``, without generating the rest.
+
+        Every step from a square to a child moves by at most the parent's
+        side, and sides halve at each level, so the n-square and all its
+        descendants lie in ``[x, x + 2/n] x [y, y + 2/n]``.  A subtree whose
+        box misses the viewport is skipped whole, and so is every square
+        below ``min_side`` (its descendants are smaller still).  The tree is
+        walked a level at a time, which keeps the squares in order of ``n``.
+        """
+        x0, y0, x1, y1, min_side = map(Fraction, (x0, y0, x1, y1, min_side))
+        if min_side <= 0:
+            raise ValueError("min_side must be positive")
+        max_n = floor(1 / min_side)
+        child_position = self._child_position
+        level = [(1, self._ROOT)] if max_n >= 1 else []
+        while level:
+            next_level = []
+            for n, state in level:
+                x = state[0]
+                y = state[1]
+                reach = Fraction(2, n)
+                if x >= x1 or y >= y1 or x + reach <= x0 or y + reach <= y0:
+                    continue
+                side = Fraction(1, n)
+                if x + side > x0 and y + side > y0:
+                    yield self._from_state(n, state)
+                for child in (2 * n, 2 * n + 1):
+                    if child <= max_n:
+                        next_level.append((child, child_position(state, child)))
+            level = next_level
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.stop is None:
+                raise ValueError("square slices need an explicit stop")
+            start = 1 if key.start is None else key.start
+            return list(self.iter_range(start, key.stop, key.step or 1))
+        if key < 1:
+            raise IndexError("squares are numbered from 1")
+        return self._square(key)
+
+    def iter_range(
+        self, start: int = 1, stop: Optional[int] = None, step: int = 1
+    ) -> Iterator:
+        """Yield squares ``start, start + step, ...`` below ``stop`` (if given)."""
+        if start < 1:
+            raise IndexError("squares are numbered from 1")
+        if step < 1:
+            raise ValueError("step must be positive")
+        n = start
+        while stop is None or n < stop:
+            yield self._square(n)
+            n += step
+
+    def __iter__(self):
+        # without this, iteration would fall back to ``__getitem__(0)``
+        raise TypeError(
+            f"{type(self).__name__} is unbounded; use iter_range() or a slice"
+        )
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from fractions import Fraction
+from math import pi
+from typing import Dict
+
+# Boundary quantities tracked in docs/todo.md and docs/open_problems.md,
+# updated square by square instead of being recomputed from ``summary()``.
+
+BASEL = pi * pi / 6
+
+
+@dataclass(frozen=True)
+class MetricsSnapshot:
+    """Values of ``Metrics`` after ``count`` squares.
+
+    ``ground`` is the length of the stack on ``y = 0`` and ``alpha`` the
+    total length of square tops lying on ``y = 1`` (the alpha of
+    docs/open_problems.md for the Sylvester stacks).  ``columns`` maps column
+    ``k`` (the strip ``k * column_width <= x < (k + 1) * column_width``) to
+    the highest square top reaching into it.
+    """
+
+    count: int
+    ground: Fraction
+    alpha: Fraction
+    width: Fraction
+    height: Fraction
+    area: float
+    area_gap: float  # pi**2 / 6 - area
+    column_width: Fraction
+    columns: Dict[int, Fraction]
+
+
+class Metrics:
+    """Running boundary metrics, O(1) per square plus the columns it spans."""
+
+    def __init__(self, column_width: Fraction = Fraction(1, 64)) -> None:
+        self.column_width = column_width
+        self.count = 0
+        self.ground = Fraction(0)
+        self.alpha = Fraction(0)
+        self.width = Fraction(0)
+        self.height = Fraction(0)
+        # Neumaier-compensated float sum of 1/n**2; the exact sum would carry
+        # a denominator of about 2.9 N bits
+        self._area = 0.0
+        self._area_error = 0.0
+        self.columns: Dict[int, Fraction] = {}
+
+    def add(self, n: int, x: Fraction, y: Fraction) -> None:
+        side = Fraction(1, n)
+        right = x + side
+        top = y + side
+        self.count += 1
+        if y == 0:
+            self.ground += side
+        if top == 1:
+            self.alpha += side
+        if right > self.width:
+            self.width = right
+        if top > self.height:
+            self.height = top
+        term = 1.0 / (n * n)
+        total = self._area + term
+        if abs(self._area) >= term:
+            self._area_error += (self._area - total) + term
+        else:
+            self._area_error += (term - total) + self._area
+        self._area = total
+        columns = self.columns
+        first = int(x / self.column_width)
+        # columns the half-open span [x, right) reaches into
+        last = -int(-right // self.column_width) - 1
+        for k in range(first, last + 1):
+            if columns.get(k, 0) < top:
+                columns[k] = top
+
+    def snapshot(self) -> MetricsSnapshot:
+        area = self._area + self._area_error
+        return MetricsSnapshot(
+            count=self.count,
+            ground=self.ground,
+            alpha=self.alpha,
+            width=self.width,
+            height=self.height,
+            area=area,
+            area_gap=BASEL - area,
+            column_width=self.column_width,
+            columns=dict(self.columns),
+        )
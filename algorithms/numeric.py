@@ -0,0 +1,303 @@
+from __future__ import annotations
+from fractions import Fraction
+from math import lcm
+from typing import Optional, Union
+
+# Numeric modes for the placement code.  The stacks are written against a
+# small backend interface (``zero``, ``one``, ``side(n)``, ``value``,
+# ``exact`` and ``grow(n)``) so the same placement logic can run on plain
+# ``Fraction`` values, on ``Approx`` values that settle most comparisons in
+# float64, or on integers over one shared denominator.
+
+# A float produced by ``float(Fraction)`` is correctly rounded, so it is off
+# by at most 2**-53 of its magnitude; a float sum or difference adds at most
+# that much again of its own magnitude.  ``Approx`` carries the bound with a
+# factor of two to spare (which also covers rounding in the bound itself) and
+# decides anything inside the combined bounds of two values exactly.
+_RELATIVE = 2.0 ** -52
+# Below this magnitude floats lose relative precision (subnormals, underflow
+# to zero), so such comparisons always go to the exact path.
+_TINY = 2.0 ** -1000
+
+
+class Counter:
+    __slots__ = ("fallbacks",)
+
+    def __init__(self) -> None:
+        self.fallbacks = 0
+
+
+class Approx:
+    """A float with an error bound, standing for an exact ``Fraction``.
+
+    Comparisons are answered from the floats whenever the gap between them is
+    larger than their error bounds; otherwise the exact values are compared
+    and ``counter.fallbacks`` is incremented.  Sums and differences are done
+    in float and only remember their operands, so the exact value is worked
+    out when a comparison or ``exact`` first needs it.
+    """
+
+    __slots__ = ("_exact", "approx", "error", "counter", "_terms")
+
+    def __init__(self, exact: Fraction, counter: Counter) -> None:
+        self._exact = exact
+        self.approx = float(exact)
+        self.error = _RELATIVE * abs(self.approx)
+        self.counter = counter
+        self._terms = None
+
+    @classmethod
+    def _combine(cls, a: "Approx", b: "Approx", negate: bool) -> "Approx":
+        result = cls.__new__(cls)
+        approx = a.approx - b.approx if negate else a.approx + b.approx
+        result._exact = None
+        result.approx = approx
+        result.error = a.error + b.error + _RELATIVE * abs(approx)
+        result.counter = a.counter
+        result._terms = (a, b, negate)
+        return result
+
+    @property
+    def exact(self) -> Fraction:
+        """The exact value, computed on first use.
+
+        Pending operands are worked out bottom-up without recursion, since a
+        value can sit at the end of a long chain of sums, and every value
+        worked out gets a fresh float and a tight bound.
+        """
+        if self._exact is None:
+            pending = [self]
+            while pending:
+                value = pending[-1]
+                if value._exact is not None:
+                    pending.pop()
+                    continue
+                a, b, negate = value._terms
+                if a._exact is None:
+                    pending.append(a)
+                elif b._exact is None:
+                    pending.append(b)
+                else:
+                    exact = a._exact - b._exact if negate else a._exact + b._exact
+                    # the float can be tightened now as well
+                    value._exact = exact
+                    value.approx = float(exact)
+                    value.error = _RELATIVE * abs(value.approx)
+                    value._terms = None
+                    pending.pop()
+        return self._exact
+
+    def _other(self, other) -> "Approx":
+        if isinstance(other, Approx):
+            return other
+        if isinstance(other, (int, Fraction)):
+            return Approx(Fraction(other), self.counter)
+        return NotImplemented
+
+    def _cmp(self, other: "Approx") -> int:
+        if self is other:
+            return 0
+        a = self.approx
+        b = other.approx
+        margin = self.error + other.error
+        if margin > _TINY:
+            if a - b > margin:
+                return 1
+            if b - a > margin:
+                return -1
+        self.counter.fallbacks += 1
+        # Near ties are usually exact ties, and equality of two normalized
+        # fractions is much cheaper than ordering them.
+        x = self.exact
+        y = other.exact
+        if x == y:
+            return 0
+        return -1 if x < y else 1
+
+    def __lt__(self, other) -> bool:
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return self._cmp(other) < 0
+
+    def __le__(self, other) -> bool:
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return self._cmp(other) <= 0
+
+    def __gt__(self, other) -> bool:
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return self._cmp(other) > 0
+
+    def __ge__(self, other) -> bool:
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return self._cmp(other) >= 0
+
+    def __eq__(self, other) -> bool:
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return self._cmp(other) == 0
+
+    def __ne__(self, other) -> bool:
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return self._cmp(other) != 0
+
+    def __hash__(self) -> int:
+        return hash(self.exact)
+
+    def __add__(self, other) -> "Approx":
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return Approx._combine(self, other, False)
+
+    __radd__ = __add__
+
+    def __sub__(self, other) -> "Approx":
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return Approx._combine(self, other, True)
+
+    def __rsub__(self, other) -> "Approx":
+        other = self._other(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return Approx._combine(other, self, True)
+
+    def __float__(self) -> float:
+        return self.approx
+
+    def __repr__(self) -> str:
+        return f"Approx({self.exact!r})"
+
+
+class ExactBackend:
+    """Plain ``Fraction`` arithmetic; every comparison is exact."""
+
+    name = "exact"
+
+    def __init__(self) -> None:
+        self.zero = Fraction(0)
+        self.one = Fraction(1)
+
+    @property
+    def fallbacks(self) -> int:
+        return 0
+
+    def grow(self, n: int) -> Optional[int]:
+        return None
+
+    def side(self, n: int) -> Fraction:
+        return Fraction(1, n)
+
+    def value(self, fr: Fraction) -> Fraction:
+        return fr
+
+    def exact(self, value: Fraction) -> Fraction:
+        return value
+
+
+class FloatBackend:
+    """``Approx`` values: float64 decisions certified by exact fallbacks."""
+
+    name = "float"
+
+    def __init__(self) -> None:
+        self._counter = Counter()
+        self.zero = Approx(Fraction(0), self._counter)
+        self.one = Approx(Fraction(1), self._counter)
+
+    @property
+    def fallbacks(self) -> int:
+        return self._counter.fallbacks
+
+    def grow(self, n: int) -> Optional[int]:
+        return None
+
+    def side(self, n: int) -> Approx:
+        return Approx(Fraction(1, n), self._counter)
+
+    def value(self, fr: Fraction) -> Approx:
+        return Approx(fr, self._counter)
+
+    def exact(self, value: Approx) -> Fraction:
+        return value.exact
+
+
+class IntegerBackend:
+    """Integers over one shared denominator.
+
+    A value ``v`` stands for ``v / denominator``, so additions and comparisons
+    are plain integer operations with no gcd reductions.  The denominator is
+    the lcm of ``1..covered`` and grows lazily: ``grow(n)`` extends it to cover
+    ``1/n`` (doubling the covered range so rescales stay rare) and returns the
+    factor every stored value must be multiplied by, or ``None`` if nothing
+    changed.  The integers get as long as ``lcm(1..N)``, roughly ``1.44 N``
+    bits, so this pays off for moderate ``N`` where Fraction gcds dominate.
+    """
+
+    name = "integer"
+
+    def __init__(self) -> None:
+        self.denominator = 1
+        self._covered = 1
+        self.zero = 0
+        self.one = 1
+
+    @property
+    def fallbacks(self) -> int:
+        return 0
+
+    def grow(self, n: int) -> Optional[int]:
+        if n <= self._covered:
+            return None
+        target = max(n, 2 * self._covered)
+        denominator = self.denominator
+        for k in range(self._covered + 1, target + 1):
+            denominator = lcm(denominator, k)
+        self._covered = target
+        factor = denominator // self.denominator
+        if factor == 1:
+            return None
+        self.denominator = denominator
+        self.one = denominator
+        return factor
+
+    def side(self, n: int) -> int:
+        return self.denominator // n
+
+    def value(self, fr: Fraction) -> int:
+        if self.denominator % fr.denominator:
+            raise ValueError(f"{fr} is not a multiple of 1/{self.denominator}")
+        return fr.numerator * (self.denominator // fr.denominator)
+
+    def exact(self, value: int) -> Fraction:
+        return Fraction(value, self.denominator)
+
+
+Backend = Union[ExactBackend, FloatBackend, IntegerBackend]
+
+NUMERIC_MODES = {
+    "exact": ExactBackend,
+    "float": FloatBackend,
+    "integer": IntegerBackend,
+}
+
+
+def backend(name: str) -> Backend:
+    """Return a fresh backend for the numeric mode ``name``."""
+    try:
+        return NUMERIC_MODES[name]()
+    except KeyError:
+        raise ValueError(
+            f"unknown numeric mode {name!r}; choose from {sorted(NUMERIC_MODES)}"
+        ) from None
@@ -0,0 +1,310 @@
+from __future__ import annotations
+import importlib
+import json
+import mmap
+import struct
+from fractions import Fraction
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .store import SquareStore
+
+# Binary stack files.
+#
+#   0   magic ``BASELSTK``
+#   8   u32 format version, u32 header length
+#   16  JSON header, padded to a multiple of 8
+#   ... data sections, at the header's offsets relative to the end of the
+#       padded header
+#
+# The square table is stored column-wise like ``SquareStore``: ``n`` and
+# ``parent`` as int64 columns, ``x`` and ``y`` as uint64 offsets into a heap
+# of exact values and ``direction`` as one byte per square.  Each heap value is
+# a Fraction written as two u32 byte lengths followed by the signed
+# little-endian numerator and the denominator.  All columns are 8-byte
+# aligned, so a memory-mapped file can be read in place (``SquareTable``).
+#
+# Whatever else a ``Stack`` needs to continue building (skyline segments,
+# corners, the current round) comes from its ``_state()`` hook and is written
+# in a small tagged encoding after the heap.
+
+MAGIC = b"BASELSTK"
+VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+# the two byte lengths in front of every heap value
+LENGTHS = struct.Struct("<II")
+
+# The only modules a stack file may name, and the constructor options it may
+# pass; anything else is refused before it is imported or called.
+STACK_MODULES = tuple(
+    f"{__package__}.{name}"
+    for name in ("sylvester", "sylvester_with_seams", "erdos", "rational")
+)
+_OPTIONS = ("strict", "open_bounds", "numeric")
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _int_bytes(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 8) // 8, "little", signed=True)
+
+
+def write_fraction(out: bytearray, fr: Fraction) -> int:
+    """Append ``fr`` as a heap value to ``out`` and return its offset."""
+    offset = len(out)
+    num = _int_bytes(fr.numerator)
+    den = _int_bytes(fr.denominator)
+    out += LENGTHS.pack(len(num), len(den))
+    out += num
+    out += den
+    return offset
+
+
+def read_fraction(buf, offset: int) -> Fraction:
+    """The heap value written by ``write_fraction`` at ``offset``."""
+    num_len, den_len = LENGTHS.unpack_from(buf, offset)
+    start = offset + LENGTHS.size
+    num = int.from_bytes(buf[start:start + num_len], "little", signed=True)
+    start += num_len
+    den = int.from_bytes(buf[start:start + den_len], "little", signed=True)
+    return Fraction(num, den)
+
+
+# tagged encoding for ``_state()`` values: None, bools, ints, Fractions and
+# (nested) lists or tuples, which all come back as lists
+def _encode(out: bytearray, value: Any) -> None:
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        data = _int_bytes(value)
+        out += b"I" + struct.pack("<I", len(data)) + data
+    elif isinstance(value, Fraction):
+        out += b"Q"
+        write_fraction(out, value)
+    elif isinstance(value, (list, tuple)):
+        out += b"L" + struct.pack("<I", len(value))
+        for item in value:
+            _encode(out, item)
+    else:
+        raise TypeError(f"cannot store {type(value).__name__} in a stack file")
+
+
+def _decode(buf, offset: int) -> Tuple[Any, int]:
+    tag = bytes(buf[offset:offset + 1])
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"I":
+        (size,) = struct.unpack_from("<I", buf, offset)
+        offset += 4
+        data = buf[offset:offset + size]
+        return int.from_bytes(data, "little", signed=True), offset + size
+    if tag == b"Q":
+        num_len, den_len = LENGTHS.unpack_from(buf, offset)
+        return read_fraction(buf, offset), offset + LENGTHS.size + num_len + den_len
+    if tag == b"L":
+        (count,) = struct.unpack_from("<I", buf, offset)
+        offset += 4
+        items = []
+        for _ in range(count):
+            item, offset = _decode(buf, offset)
+            items.append(item)
+        return items, offset
+    raise ValueError(f"corrupt stack file: unknown tag {tag!r}")
+
+
+def _options(stack) -> dict:
+    return {
+        name: getattr(stack, name)
+        for name in _OPTIONS
+        if hasattr(stack, name)
+    }
+
+
+def _stack_module(header: dict, path: str):
+    name = header.get("module")
+    if name not in STACK_MODULES:
+        raise ValueError(f"{path}: {name!r} is not a stack module")
+    unknown = set(header.get("options", {})) - set(_OPTIONS)
+    if unknown:
+        raise ValueError(f"{path}: unknown stack options {sorted(unknown)}")
+    return importlib.import_module(name)
+
+
+def save(stack, path: str) -> None:
+    """Write ``stack`` (squares plus placement state) to ``path``."""
+    squares = stack.squares
+    count = len(squares)
+    links = squares.links
+    heap = bytearray()
+    x_offsets = struct.pack(f"<{count}Q", *(write_fraction(heap, v) for v in squares.x))
+    y_offsets = struct.pack(f"<{count}Q", *(write_fraction(heap, v) for v in squares.y))
+    values = stack._state()
+    state = bytearray()
+    _encode(state, list(values.values()))
+
+    sections: List[Tuple[str, bytes]] = [
+        ("n", squares.n.tobytes()),
+        ("x", x_offsets),
+        ("y", y_offsets),
+    ]
+    if links:
+        sections.append(("parent", squares.parent.tobytes()))
+        sections.append(("direction", bytes(squares.direction)))
+    sections.append(("heap", bytes(heap)))
+    sections.append(("state", bytes(state)))
+
+    offsets = {}
+    position = 0
+    for name, data in sections:
+        offsets[name] = position
+        position = _align(position + len(data))
+    header = json.dumps(
+        {
+            "module": type(stack).__module__,
+            "options": _options(stack),
+            "count": count,
+            "links": links,
+            "state": list(values),
+            "sections": offsets,
+        }
+    ).encode()
+    header += b" " * (_align(_PREFIX.size + len(header)) - _PREFIX.size - len(header))
+    with open(path, "wb") as fh:
+        fh.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        fh.write(header)
+        for name, data in sections:
+            fh.write(data)
+            fh.write(b"\0" * (_align(len(data)) - len(data)))
+
+
+class SquareTable:
+    """Read-only, memory-mapped view of the squares in a stack file.
+
+    Behaves like ``stack.squares``: ``len``, indexing, slicing and iteration
+    yield the saving module's ``Square`` records, decoded on access.  The
+    ``n`` column (and ``parent``/``direction`` for rational stacks) is exposed
+    as a memoryview over the file.  ``count`` limits the view to a prefix.
+    """
+
+    def __init__(self, path: str, count: Optional[int] = None) -> None:
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._map)
+        magic, version, header_len = _PREFIX.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a stack file")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported stack file version {version}")
+        self.header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + header_len]))
+        self._record = _stack_module(self.header, path).Square
+        base = _PREFIX.size + header_len
+        total = self.header["count"]
+        self._len = total if count is None else max(0, min(count, total))
+        sections = {name: base + off for name, off in self.header["sections"].items()}
+        self._sections = sections
+        self._buf = buf
+        self.links = self.header["links"]
+        self.n = buf[sections["n"]:sections["n"] + 8 * total].cast("q")
+        self._x = buf[sections["x"]:sections["x"] + 8 * total].cast("Q")
+        self._y = buf[sections["y"]:sections["y"] + 8 * total].cast("Q")
+        if self.links:
+            self.parent = buf[sections["parent"]:sections["parent"] + 8 * total].cast("q")
+            self.direction = buf[sections["direction"]:sections["direction"] + total]
+        else:
+            self.parent = None
+            self.direction = None
+        self._heap = sections["heap"]
+
+    def close(self) -> None:
+        for view in (self.n, self._x, self._y, self.parent, self.direction):
+            if view is not None:
+                view.release()
+        self._buf.release()
+        self._map.close()
+
+    def __enter__(self) -> "SquareTable":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def x(self, index: int) -> Fraction:
+        return read_fraction(self._buf, self._heap + self._x[index])
+
+    def y(self, index: int) -> Fraction:
+        return read_fraction(self._buf, self._heap + self._y[index])
+
+    def state(self) -> dict:
+        value, _ = _decode(self._buf, self._sections["state"])
+        return dict(zip(self.header["state"], value))
+
+    def _make(self, i: int):
+        n = self.n[i]
+        if self.links:
+            direction = (None, "right", "up")[self.direction[i]]
+            return self._record(
+                n, Fraction(1, n), self.x(i), self.y(i), direction, self.parent[i] or None
+            )
+        return self._record(n, Fraction(1, n), self.x(i), self.y(i))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._make(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("square index out of range")
+        return self._make(index)
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self)):
+            yield self._make(i)
+
+
+class SavedStack:
+    """A stack file opened for reading only; ``squares`` is a ``SquareTable``."""
+
+    def __init__(self, path: str, count: Optional[int] = None) -> None:
+        self.squares = SquareTable(path, count)
+
+    def close(self) -> None:
+        self.squares.close()
+
+
+def load(path: str, cls=None):
+    """Rebuild the ``Stack`` saved at ``path`` so that it can keep building.
+
+    ``cls`` (the caller's ``Stack`` class) is checked against the module that
+    wrote the file.
+    """
+    with SquareTable(path) as table:
+        module = _stack_module(table.header, path)
+        if cls is not None and cls is not module.Stack:
+            raise ValueError(
+                f"{path} holds a {table.header['module']} stack, "
+                f"not {cls.__module__}"
+            )
+        stack = module.Stack(**table.header["options"])
+        squares = SquareStore(module.Square, links=table.links)
+        squares.n.frombytes(table.n.tobytes())
+        squares.x = [table.x(i) for i in range(len(table))]
+        squares.y = [table.y(i) for i in range(len(table))]
+        if table.links:
+            squares.parent.frombytes(table.parent.tobytes())
+            squares.direction[:] = table.direction
+        state = table.state()
+    stack._restore(squares, state)
+    return stack
@@ -1,7 +1,16 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from fractions import Fraction
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .arrays import SquareArrays, empty, levels, require_numpy, step
+from .lazy import AncestorCache, LazySquares
+from .numeric import backend
+from .store import SquareStore, StoredSquares
+
+# Every square lies inside [0, 2] x [0, 5/3]: the bottom edge runs along
+# 1 + 1/2 + 1/4 + ... and the left edge along 1 + 1/3 + 1/6 + 1/12 + ...
+EXTENT = (Fraction(2), Fraction(5, 3))
 
 @dataclass
 class Square:
@@ -12,64 +21,166 @@ class Square:
     direction: Optional[str] = None
     parent: Optional[int] = None
 
-class Stack:
-    """Construct squares according to the rational stacking specification."""
+class Stack(StoredSquares, LazySquares):
+    """Construct squares according to the rational stacking specification.
+
+    Besides ``build``, any square can be read directly as ``stack[n]`` (or a
+    range as ``stack[a:b]``); it is derived from its chain of parents
+    ``n // 2, n // 4, ...`` without building the squares in between.
+    ``iter_view`` generates only the squares of a viewport above a size."""
 
-    def __init__(self, strict: bool = True) -> None:
+    # the 1-square counts as placed "right" so that 2 continues right and 3
+    # turns up
+    _ROOT = (Fraction(0), Fraction(0), "right")
+
+    def __init__(self, strict: bool = True, numeric: str = "exact") -> None:
         # ``strict`` is accepted for API compatibility but ignored.
-        self.squares: List[Square] = []
-        self._map: Dict[int, Square] = {}
+        # ``numeric`` selects the arithmetic used while expanding a round
+        # (see ``algorithms.numeric``); stored squares are always exact.
+        self.numeric = numeric
+        self._num = backend(numeric)
+        self.squares = SquareStore(Square, links=True)
+        # backend coordinates and direction of the squares in
+        # ``_current_round`` and of the children placed from it so far
+        self._coords: Dict[int, Tuple[Fraction, Fraction, str]] = {}
         self._init_seed()
+        self._ancestors = AncestorCache(self._ROOT, self._child_position)
+
+    @staticmethod
+    def _child_position(
+        parent: Tuple[Fraction, Fraction, str], n: int
+    ) -> Tuple[Fraction, Fraction, str]:
+        x, y, direction = parent
+        side = Fraction(1, n // 2)
+        if n % 2 == 1:
+            direction = "up" if direction == "right" else "right"
+        if direction == "right":
+            return x + side, y, direction
+        return x, y + side, direction
+
+    @staticmethod
+    def _from_state(n: int, state: Tuple[Fraction, Fraction, str]) -> Square:
+        if n == 1:
+            return Square(1, Fraction(1), Fraction(0), Fraction(0))
+        x, y, direction = state
+        return Square(n, Fraction(1, n), x, y, direction, n // 2)
+
+    def _square(self, n: int) -> Square:
+        squares = self.squares
+        if n <= len(squares) and squares.n[n - 1] == n:
+            return squares[n - 1]
+        return self._from_state(n, self._ancestors(n))
 
     def _init_seed(self) -> None:
+        num = self._num
+        num.grow(3)
         # create 1-square
-        b1 = Square(1, Fraction(1), Fraction(0), Fraction(0))
-        self.squares.append(b1)
-        self._map[1] = b1
+        self.squares.add(1, Fraction(0), Fraction(0))
         # place 2-square to the right and 3-square above
-        b2 = Square(2, Fraction(1, 2), Fraction(1), Fraction(0), "right", 1)
-        b3 = Square(3, Fraction(1, 3), Fraction(0), Fraction(1), "up", 1)
-        self.squares.extend([b2, b3])
-        self._map[2] = b2
-        self._map[3] = b3
+        self._add_square(2, num.one, num.zero, "right", 1)
+        self._add_square(3, num.zero, num.one, "up", 1)
         self._current_round: List[int] = [2, 3]
 
     def _add_square(self, n: int, x: Fraction, y: Fraction, direction: str, parent: int) -> None:
-        square = Square(n, Fraction(1, n), x, y, direction, parent)
-        self.squares.append(square)
-        self._map[n] = square
+        exact = self._num.exact
+        self.squares.add(n, exact(x), exact(y), direction, parent)
+        self._coords[n] = (x, y, direction)
 
     def build(self, count: int) -> None:
-        if count <= 3:
-            return
-        while max(self._map) < count:
+        for _ in self.iter_build(count):
+            pass
+
+    def iter_build(self, count: Optional[int] = None) -> Iterator[Square]:
+        """Extend the stack to ``count`` squares (without end if ``None``),
+        yielding each new ``Square`` as soon as it is placed.
+
+        Squares are placed a round at a time, but in order of ``n``.
+        """
+        num = self._num
+        last = self.squares.n[-1]
+        while count is None or last < count:
+            round_end = 2 * self._current_round[-1] + 1
+            stop = round_end if count is None else min(count, round_end)
+            factor = num.grow(stop)
+            if factor is not None:
+                self._coords = {
+                    n: (x * factor, y * factor, d)
+                    for n, (x, y, d) in self._coords.items()
+                }
+            coords = self._coords
             next_round: List[int] = []
             for n in self._current_round:
-                b = self._map[n]
+                x, y, direction = coords[n]
+                side = num.side(n)
                 even = 2 * n
                 odd = even + 1
-                if b.direction == "right":
-                    x_even = b.x + b.side
-                    y_even = b.y
+                if direction == "right":
+                    x_even = x + side
+                    y_even = y
                     orient_even = "right"
-                    x_odd = b.x
-                    y_odd = b.y + b.side
+                    x_odd = x
+                    y_odd = y + side
                     orient_odd = "up"
                 else:
-                    x_even = b.x
-                    y_even = b.y + b.side
+                    x_even = x
+                    y_even = y + side
                     orient_even = "up"
-                    x_odd = b.x + b.side
-                    y_odd = b.y
+                    x_odd = x + side
+                    y_odd = y
                     orient_odd = "right"
-                if even <= count:
+                # children up to ``last`` were placed by an earlier call
+                if last < even <= stop:
                     self._add_square(even, x_even, y_even, orient_even, n)
-                    next_round.append(even)
-                if odd <= count:
+                    yield self.squares[-1]
+                if last < odd <= stop:
                     self._add_square(odd, x_odd, y_odd, orient_odd, n)
-                    next_round.append(odd)
+                    yield self.squares[-1]
+                next_round.extend(m for m in (even, odd) if m <= stop)
+            last = self.squares.n[-1]
+            if last < round_end:
+                # round cut short by ``count``; a later call resumes it
+                break
+            for n in self._current_round:
+                del coords[n]
             self._current_round = next_round
 
+    def _state(self) -> dict:
+        return {"current_round": self._current_round}
+
+    def _restore(self, squares: SquareStore, state: dict) -> None:
+        num = self._num
+        num.grow(max(3, squares.n[-1]))
+        value = num.value
+        self.squares = squares
+        self._current_round = state["current_round"]
+        # coordinates of the current round and of any children already placed
+        self._coords = {}
+        for n in range(self._current_round[0], squares.n[-1] + 1):
+            square = squares[n - 1]
+            self._coords[n] = (value(square.x), value(square.y), square.direction)
+
+    def build_array(self, count: int, exact: bool = False) -> SquareArrays:
+        """Return squares ``1..count`` as NumPy arrays (requires NumPy).
+
+        Square ``n`` inherits the direction of ``n // 2`` when ``n`` is even
+        and takes the other one when odd, then sits one parent side away in
+        that direction, so each round is a single vectorized step.
+        ``exact=True`` keeps integer numerators and denominators instead of
+        float64.  ``self.squares`` is not touched.
+        """
+        np = require_numpy()
+        n, x, y, side, den = empty(np, count, exact)
+        # 0 = right, 1 = up; the 1-square counts as "right" so that the
+        # 2-square continues right and the 3-square turns up.
+        direction = np.zeros(count, dtype=np.int8)
+        parent = n >> 1
+        for start, stop in levels(count):
+            ns = n[start - 1:stop - 1]
+            direction[ns - 1] = direction[(ns >> 1) - 1] ^ (ns & 1)
+            right = direction[ns - 1] == 0
+            step(np, x, y, den, ns, ns >> 1, right, exact)
+        return SquareArrays(n, x, y, side, den, direction, parent)
+
     def summary(self) -> str:
         lines = []
         for b in sorted(self.squares, key=lambda b: b.n):
@@ -77,3 +188,45 @@ class Stack:
                 f"n={b.n}: left={b.x} bottom={b.y} side={b.side}"
             )
         return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .export import add_arguments, export
+    from . import stats
+
+    parser = argparse.ArgumentParser(description="Construct the rational square stack")
+    parser.add_argument("N", type=int, nargs="?", default=10, help="number of squares to place")
+    parser.add_argument(
+        "--numeric",
+        choices=["exact", "float", "integer"],
+        default="exact",
+        help="arithmetic for expanding rounds (results are identical)",
+    )
+    parser.add_argument(
+        "--view",
+        nargs=4,
+        type=Fraction,
+        metavar=("X0", "Y0", "X1", "Y1"),
+        help="only generate squares overlapping this box, down to side 1/N",
+    )
+    parser.add_argument(
+        "--min-side",
+        type=Fraction,
+        help="smallest side generated with --view (default: 1/N)",
+    )
+    add_arguments(parser)
+    stats.add_arguments(parser)
+    args = parser.parse_args()
+
+    stack = Stack(numeric=args.numeric)
+    if args.view is not None:
+        min_side = args.min_side or Fraction(1, args.N)
+        export(stack.iter_view(*args.view, min_side), args.output, args.format, args.digits)
+    else:
+        if stats.requested(args):
+            stack.profile()
+        stack.build(args.N)
+        export(stack, args.output, args.format, args.digits)
+        stats.emit(stack.stats, args.profile_json)
@@ -0,0 +1,295 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from fractions import Fraction
+from random import Random
+from typing import Iterator, List, Optional, Tuple
+
+from .corners import _merge, _size, _split
+
+Segment = Tuple[Fraction, Fraction, Fraction]
+
+
+# The segments are mirrored, in order, in an implicit treap (a balanced
+# segment tree that survives the splices of ``insert``).  Besides its height
+# each node knows the room of its segment (see ``Skyline``) and its
+# ``floor``: the height, or 0 after a gap.  Subtrees keep the highest and
+# lowest height, the lowest floor and the most room, so range maxima and
+# minima are logarithmic and a search for the next segment with room for a
+# square skips whole runs of segments.
+
+
+class _Node:
+    __slots__ = (
+        "height",
+        "floor",
+        "room",
+        "priority",
+        "size",
+        "left",
+        "right",
+        "max_height",
+        "min_height",
+        "min_floor",
+        "max_room",
+    )
+
+    def __init__(self, height, floor, room, priority: float) -> None:
+        self.height = height
+        self.floor = floor
+        self.room = room
+        self.priority = priority
+        self.left: Optional[_Node] = None
+        self.right: Optional[_Node] = None
+        self._update()
+
+    def _update(self) -> None:
+        size = 1
+        max_height = min_height = self.height
+        min_floor = self.floor
+        max_room = self.room
+        for child in (self.left, self.right):
+            if child is None:
+                continue
+            size += child.size
+            if child.max_height > max_height:
+                max_height = child.max_height
+            if child.min_height < min_height:
+                min_height = child.min_height
+            if child.min_floor < min_floor:
+                min_floor = child.min_floor
+            if child.max_room is not None and (max_room is None or child.max_room > max_room):
+                max_room = child.max_room
+        self.size = size
+        self.max_height = max_height
+        self.min_height = min_height
+        self.min_floor = min_floor
+        self.max_room = max_room
+
+
+def _fold(node: Optional[_Node], lo: int, hi: int, own: str, whole: str, lower: bool):
+    """The least (``lower``) or greatest ``own`` value at positions
+    ``lo <= i < hi`` of ``node``, using the subtree aggregate ``whole`` for
+    subtrees inside the range; ``None`` for an empty range."""
+    best = None
+    while node is not None and lo < hi:
+        if lo <= 0 and hi >= node.size:
+            value = getattr(node, whole)
+            if best is None or (value < best if lower else value > best):
+                best = value
+            break
+        left = _size(node.left)
+        if hi <= left:
+            node = node.left
+            continue
+        if lo > left:
+            lo -= left + 1
+            hi -= left + 1
+            node = node.right
+            continue
+        for value in (getattr(node, own), _fold(node.left, lo, left, own, whole, lower)):
+            if value is not None and (best is None or (value < best if lower else value > best)):
+                best = value
+        lo = 0
+        hi -= left + 1
+        node = node.right
+    return best
+
+
+def _first_room(node: Optional[_Node], start: int, side, limit, offset: int) -> Optional[int]:
+    """First position from ``start`` on with room for ``side`` and a height
+    of at most ``limit``."""
+    if node is None or offset + node.size <= start:
+        return None
+    if node.max_room is None or node.max_room < side or node.min_height > limit:
+        return None
+    found = _first_room(node.left, start, side, limit, offset)
+    if found is not None:
+        return found
+    index = offset + _size(node.left)
+    if index >= start and node.room is not None and node.room >= side and node.height <= limit:
+        return index
+    return _first_room(node.right, start, side, limit, index + 1)
+
+
+class Skyline:
+    """Top surface of a stack as ordered, non-overlapping ``(l, r, h)`` segments.
+
+    The segments are kept in three parallel lists sorted by their left edge,
+    so lookups are binary searches and an insert splices the affected range
+    in place; height queries go through a tree kept alongside.  Positions not covered by any segment are ground (height 0).
+    Adjacent segments of equal height are deliberately left separate so that
+    strict support can still tell individual supports apart.
+
+    The room of a segment bounds the square that can rest on it against its
+    left edge: the smaller of its width (unless an equal neighbour continues
+    it) and the wall at that edge, which is how far up from the segment
+    something stands against the edge.  By default the wall is the drop from
+    the segment ending there; an owner that knows more about what is below
+    the surface passes ``wall(x, height)`` instead.  It is asked when a
+    segment or one of its neighbours changes, so it must not depend on
+    anything else that changes later.
+    """
+
+    def __init__(self, segments=(), zero=Fraction(0), wall=None) -> None:
+        # ``zero`` is the ground height in whatever number type the caller
+        # stores (see ``algorithms.numeric``).
+        self.zero = zero
+        self._wall = wall
+        self.lefts: List[Fraction] = []
+        self.rights: List[Fraction] = []
+        self.heights: List[Fraction] = []
+        self._random = Random(0)
+        # built on the first height query, so callers that never ask do not
+        # pay for keeping it
+        self._root: Optional[_Node] = None
+        self._indexed = False
+        for l, r, h in sorted(segments):
+            self.insert(l, r, h)
+
+    def __len__(self) -> int:
+        return len(self.lefts)
+
+    def __iter__(self) -> Iterator[Segment]:
+        return zip(self.lefts, self.rights, self.heights)
+
+    def __getitem__(self, index: int) -> Segment:
+        return self.lefts[index], self.rights[index], self.heights[index]
+
+    def first_after(self, x: Fraction) -> int:
+        """Index of the first segment whose right edge lies beyond ``x``."""
+        return bisect_right(self.rights, x)
+
+    def height_at(self, x: Fraction) -> Fraction:
+        i = self.first_after(x)
+        if i < len(self.lefts) and self.lefts[i] <= x:
+            return self.heights[i]
+        return self.zero
+
+    def max_height(self, start: Fraction, end: Fraction) -> Fraction:
+        """Highest point of the surface over ``[start, end)``."""
+        i = self.first_after(start)
+        best = _fold(self._tree(), i, bisect_left(self.lefts, end, i), "height", "max_height", False)
+        return self.zero if best is None or best < self.zero else best
+
+    def min_height(self, start: Fraction, end: Fraction) -> Fraction:
+        """Lowest point of the surface over ``[start, end)``, ground included."""
+        i = self.first_after(start)
+        k = bisect_left(self.lefts, end, i)
+        if i == k or self.lefts[i] > start or self.rights[k - 1] < end:
+            return self.zero
+        best = self.heights[i]
+        floor = _fold(self._tree(), i + 1, k, "floor", "min_floor", True)
+        return best if floor is None or best < floor else floor
+
+    def next_room(self, x: Fraction, side: Fraction, limit: Fraction) -> Optional[Fraction]:
+        """Left edge of the first segment beyond ``x`` that is at most
+        ``limit`` high and has room for ``side``, or ``None``."""
+        i = _first_room(self._tree(), bisect_right(self.lefts, x), side, limit, 0)
+        return None if i is None else self.lefts[i]
+
+    def between(self, start: Fraction, end: Fraction) -> List[Segment]:
+        """Segments overlapping ``[start, end)`` in order, unclipped."""
+        segs: List[Segment] = []
+        i = self.first_after(start)
+        while i < len(self.lefts) and self.lefts[i] < end:
+            segs.append((self.lefts[i], self.rights[i], self.heights[i]))
+            i += 1
+        return segs
+
+    def count_between(self, start: Fraction, end: Fraction) -> int:
+        """Number of segments overlapping ``[start, end)``."""
+        i = self.first_after(start)
+        return max(0, bisect_left(self.lefts, end, i) - i)
+
+    def next_boundary(self, x: Fraction) -> Optional[Fraction]:
+        """Smallest segment endpoint strictly greater than ``x``."""
+        i = bisect_right(self.lefts, x)
+        j = bisect_right(self.rights, x)
+        candidates = []
+        if i < len(self.lefts):
+            candidates.append(self.lefts[i])
+        if j < len(self.rights):
+            candidates.append(self.rights[j])
+        return min(candidates) if candidates else None
+
+    def rescale(self, factor: int) -> None:
+        """Multiply every coordinate by ``factor`` (shared-denominator growth)."""
+        self.lefts = [l * factor for l in self.lefts]
+        self.rights = [r * factor for r in self.rights]
+        self.heights = [h * factor for h in self.heights]
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            node.height *= factor
+            node.floor *= factor
+            node.max_height *= factor
+            node.min_height *= factor
+            node.min_floor *= factor
+            if node.room is not None:
+                node.room *= factor
+            if node.max_room is not None:
+                node.max_room *= factor
+            pending.extend(n for n in (node.left, node.right) if n is not None)
+
+    def _tree(self) -> Optional[_Node]:
+        if not self._indexed:
+            self._indexed = True
+            for i in range(len(self.lefts)):
+                self._root = _merge(self._root, self._node(i))
+        return self._root
+
+    def _node(self, i: int) -> _Node:
+        left = self.lefts[i]
+        right = self.rights[i]
+        height = self.heights[i]
+        joined = i > 0 and left == self.rights[i - 1]
+        if self._wall is not None:
+            room = self._wall(left, height)
+        elif joined:
+            room = self.heights[i - 1] - height
+        else:
+            room = None
+        # a square on an equal neighbour as well may be any wider
+        if room is not None and (
+            i + 1 == len(self.lefts)
+            or self.lefts[i + 1] != right
+            or self.heights[i + 1] != height
+        ):
+            if right - left < room:
+                room = right - left
+        floor = height if joined or i == 0 else self.zero
+        return _Node(height, floor, room, self._random.random())
+
+    def insert(self, left: Fraction, right: Fraction, height: Fraction) -> None:
+        """Lay ``(left, right, height)`` on top, trimming what it covers."""
+        lo = bisect_right(self.rights, left)
+        hi = bisect_left(self.lefts, right, lo)
+        new_lefts: List[Fraction] = []
+        new_rights: List[Fraction] = []
+        new_heights: List[Fraction] = []
+        if lo < hi and self.lefts[lo] < left:
+            new_lefts.append(self.lefts[lo])
+            new_rights.append(left)
+            new_heights.append(self.heights[lo])
+        new_lefts.append(left)
+        new_rights.append(right)
+        new_heights.append(height)
+        if lo < hi and self.rights[hi - 1] > right:
+            new_lefts.append(right)
+            new_rights.append(self.rights[hi - 1])
+            new_heights.append(self.heights[hi - 1])
+        self.lefts[lo:hi] = new_lefts
+        self.rights[lo:hi] = new_rights
+        self.heights[lo:hi] = new_heights
+        if not self._indexed:
+            return
+        # the neighbours of the splice get a new room and floor as well
+        end = lo + len(new_heights)
+        first = lo - 1 if lo > 0 else lo
+        following = 1 if end < len(self.heights) else 0
+        before, rest = _split(self._root, first)
+        _, after = _split(rest, hi - first + following)
+        middle = None
+        for i in range(first, end + following):
+            middle = _merge(middle, self._node(i))
+        self._root = _merge(_merge(before, middle), after)
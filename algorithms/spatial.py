@@ -0,0 +1,116 @@
+from __future__ import annotations
+from fractions import Fraction
+from math import floor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+Cell = Tuple[int, int, int]  # (level, ix, iy)
+
+
+class SquareIndex:
+    """Loose quadtree over the squares of a ``SquareStore``, in exact arithmetic.
+
+    Level ``e`` (``e <= 0``) splits the plane into cells of side ``2**e``.  The
+    n-square has side ``1/n``, so it goes to the level whose cell side ``c``
+    satisfies ``c / 2 < 1/n <= c`` (that is ``e = 1 - n.bit_length()``), in
+    the cell holding its center.  Such a square never reaches more than
+    ``c / 2`` outside its cell, and non-overlapping squares of that size can
+    only crowd a cell a few at a time.
+
+    Cells are kept in a dict keyed by ``(level, ix, iy)`` together with the
+    set of every non-empty cell's ancestors, so queries walk down from the
+    level-0 cells and prune whole subtrees whose loose bounds miss the target.
+    Only the squares' indices are stored; coordinates stay in the store.
+    """
+
+    def __init__(self, store) -> None:
+        self._store = store
+        self._items: Dict[Cell, List[int]] = {}
+        # every cell with a non-empty subtree
+        self._nodes: Set[Cell] = set()
+        self._roots: Set[Cell] = set()
+        for i in range(len(store)):
+            self.add(i)
+
+    def add(self, index: int) -> None:
+        store = self._store
+        n = store.n[index]
+        level = 1 - n.bit_length()
+        scale = 2 ** -level
+        # center of the square, in units of the cell side
+        half = Fraction(1, 2 * n)
+        ix = floor((store.x[index] + half) * scale)
+        iy = floor((store.y[index] + half) * scale)
+        cell = (level, ix, iy)
+        self._items.setdefault(cell, []).append(index)
+        while cell not in self._nodes:
+            self._nodes.add(cell)
+            level, ix, iy = cell
+            if level == 0:
+                self._roots.add(cell)
+                break
+            cell = (level + 1, ix >> 1, iy >> 1)
+
+    def _cells(
+        self, x0: Fraction, y0: Fraction, x1: Fraction, y1: Fraction, lowest: Optional[int] = None
+    ) -> Iterator[Cell]:
+        """Non-empty cells whose loose bounds meet the closed box, down to
+        level ``lowest`` (all levels if ``None``)."""
+        pending = list(self._roots)
+        nodes = self._nodes
+        while pending:
+            cell = pending.pop()
+            level, ix, iy = cell
+            side = Fraction(2) ** level
+            half = side / 2
+            if (
+                ix * side - half > x1
+                or (ix + 1) * side + half < x0
+                or iy * side - half > y1
+                or (iy + 1) * side + half < y0
+            ):
+                continue
+            yield cell
+            if lowest is not None and level <= lowest:
+                continue
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    child = (level - 1, 2 * ix + dx, 2 * iy + dy)
+                    if child in nodes:
+                        pending.append(child)
+
+    def query_rect(self, x0, y0, x1, y1, max_n: Optional[int] = None) -> List[int]:
+        """Indices of squares overlapping ``[x0, x1] x [y0, y1]`` with
+        positive area, in placement order.
+
+        ``max_n`` leaves out squares numbered above it (smaller than
+        ``1/max_n``) without visiting the levels that only hold such squares.
+        """
+        x0, y0, x1, y1 = map(Fraction, (x0, y0, x1, y1))
+        store = self._store
+        xs = store.x
+        ys = store.y
+        ns = store.n
+        lowest = None if max_n is None else 1 - max_n.bit_length()
+        found = []
+        for cell in self._cells(x0, y0, x1, y1, lowest):
+            for i in self._items.get(cell, ()):
+                if max_n is not None and ns[i] > max_n:
+                    continue
+                side = Fraction(1, ns[i])
+                if xs[i] < x1 and xs[i] + side > x0 and ys[i] < y1 and ys[i] + side > y0:
+                    found.append(i)
+        found.sort()
+        return found
+
+    def locate(self, x, y) -> Optional[int]:
+        """Index of the square with ``left <= x < right`` and
+        ``bottom <= y < top``, or ``None``."""
+        x = Fraction(x)
+        y = Fraction(y)
+        store = self._store
+        for cell in self._cells(x, y, x, y):
+            for i in self._items.get(cell, ()):
+                side = Fraction(1, store.n[i])
+                if store.x[i] <= x < store.x[i] + side and store.y[i] <= y < store.y[i] + side:
+                    return i
+        return None
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import json
+import sys
+from fractions import Fraction
+from time import perf_counter
+from typing import Dict, List, Optional
+
+# Hot-path counters for stack builds.  A stack only carries a ``BuildStats``
+# after ``stack.profile()``; until then ``stack.stats`` is ``None`` and each
+# instrumented spot costs a single ``is None`` test.
+
+
+class BuildStats:
+    """Counters and timings collected while a stack places squares.
+
+    ``counters`` holds the totals of the stack's hot-path counters (corners
+    scanned by the Sylvester search, candidate positions, ``_next_boundary``
+    calls, jumps and segments touched by the seams search, ...).  Every
+    ``interval`` placed squares an entry is appended to ``intervals`` with
+    the wall time since the previous entry, the largest coordinate
+    denominator so far in bits and the counters accumulated in between.
+    """
+
+    def __init__(self, interval: int = 1000) -> None:
+        self.interval = interval
+        self.squares = 0
+        self.counters: Dict[str, int] = {}
+        self.max_denominator_bits = 0
+        self.intervals: List[dict] = []
+        self._started = perf_counter()
+        self._mark = self._started
+        self._last_n = 0
+        self._previous: Dict[str, int] = {}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def placed(self, n: int, x: Fraction, y: Fraction) -> None:
+        """Record square ``n`` placed at ``(x, y)``; called by ``SquareStore``."""
+        self.squares += 1
+        self._last_n = n
+        bits = max(x.denominator, y.denominator).bit_length()
+        if bits > self.max_denominator_bits:
+            self.max_denominator_bits = bits
+        if self.squares % self.interval == 0:
+            self._close_interval()
+
+    def _close_interval(self) -> None:
+        now = perf_counter()
+        counters = self.counters
+        previous = self._previous
+        self.intervals.append(
+            {
+                "squares": self.squares,
+                "n": self._last_n,
+                "seconds": now - self._mark,
+                "max_denominator_bits": self.max_denominator_bits,
+                "counters": {
+                    name: value - previous.get(name, 0) for name, value in counters.items()
+                },
+            }
+        )
+        self._mark = now
+        self._previous = dict(counters)
+
+    def as_dict(self) -> dict:
+        squares = self.squares
+        return {
+            "squares": squares,
+            "last_n": self._last_n,
+            "seconds": perf_counter() - self._started,
+            "max_denominator_bits": self.max_denominator_bits,
+            "counters": dict(self.counters),
+            "per_square": {
+                name: value / squares for name, value in self.counters.items()
+            }
+            if squares
+            else {},
+            "interval": self.interval,
+            "intervals": list(self.intervals),
+        }
+
+    def report(self) -> str:
+        stats = self.as_dict()
+        lines = [
+            f"squares placed: {stats['squares']} (up to n={stats['last_n']}) "
+            f"in {stats['seconds']:.3f}s",
+            f"largest coordinate denominator: {stats['max_denominator_bits']} bits",
+        ]
+        for name in sorted(stats["counters"]):
+            lines.append(
+                f"{name}: {stats['counters'][name]} "
+                f"({stats['per_square'][name]:.2f} per square)"
+            )
+        if self.intervals:
+            lines.append(f"per {self.interval} squares:")
+            for entry in self.intervals:
+                counts = " ".join(
+                    f"{name}={value}" for name, value in sorted(entry["counters"].items())
+                )
+                lines.append(
+                    f"  n<={entry['n']}: {entry['seconds']:.3f}s "
+                    f"{entry['max_denominator_bits']} bits {counts}".rstrip()
+                )
+        return "\n".join(lines)
+
+
+def emit(stats: Optional[BuildStats], path: Optional[str] = None) -> None:
+    """Print ``stats`` to stderr, or write them as JSON to ``path``."""
+    if stats is None:
+        return
+    if path is None:
+        print(stats.report(), file=sys.stderr)
+        return
+    with open(path, "w") as fh:
+        json.dump(stats.as_dict(), fh, indent=2)
+
+
+def add_arguments(parser) -> None:
+    """The ``--profile`` and ``--profile-json`` options of the entry points."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print hot-path counters and timings of the build to stderr",
+    )
+    parser.add_argument(
+        "--profile-json", metavar="FILE", help="write the build profile as JSON to FILE"
+    )
+
+
+def requested(args) -> bool:
+    """Whether the options of ``add_arguments`` ask for a profile."""
+    return args.profile or args.profile_json is not None
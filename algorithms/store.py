@@ -0,0 +1,231 @@
+from __future__ import annotations
+from array import array
+from fractions import Fraction
+from typing import Callable, Iterator, List, Optional
+
+from .metrics import Metrics, MetricsSnapshot
+from .spatial import SquareIndex
+from .stats import BuildStats
+
+# Direction codes for the optional ``direction`` column.
+_DIRECTIONS = (None, "right", "up")
+_CODES = {d: i for i, d in enumerate(_DIRECTIONS)}
+
+
+class SquareStore:
+    """Struct-of-arrays storage for placed squares.
+
+    Square numbers (and, with ``links=True``, direction codes and parents)
+    live in compact typed arrays and the exact ``x``/``y`` coordinates in
+    plain lists, so a placed square costs a few machine words plus its two
+    Fractions instead of a full object.  Every square in ``algorithms`` has
+    side ``1/n``, so the side is derived from ``n`` rather than stored.
+
+    The store behaves like the ``List[Square]`` it replaces: ``len``,
+    indexing, slicing and iteration produce ``record`` instances (the
+    module's ``Square`` dataclass) on demand, and ``append`` accepts one.
+
+    ``query_rect`` and ``locate`` answer region and point queries through a
+    ``SquareIndex`` that is built on first use and then kept up to date as
+    squares are added.  ``metrics()`` works the same way for the running
+    boundary metrics of ``algorithms.metrics``.  ``stats``, when set to a
+    ``BuildStats``, is told about every square added.
+
+    After ``keep_last()`` the store holds only the most recent square: each
+    ``add`` replaces it, so streaming a build does not accumulate squares.
+    """
+
+    def __init__(self, record: Callable, links: bool = False) -> None:
+        self._record = record
+        self.links = links
+        self.n = array("q")
+        self.x: List[Fraction] = []
+        self.y: List[Fraction] = []
+        self.direction: Optional[bytearray] = bytearray() if links else None
+        self.parent: Optional[array] = array("q") if links else None
+        self._index: Optional[SquareIndex] = None
+        self._metrics: Optional[Metrics] = None
+        self.stats: Optional[BuildStats] = None
+        self.keep = True
+
+    def add(
+        self,
+        n: int,
+        x: Fraction,
+        y: Fraction,
+        direction: Optional[str] = None,
+        parent: Optional[int] = None,
+    ) -> None:
+        if not self.keep:
+            self._drop()
+        self.n.append(n)
+        self.x.append(x)
+        self.y.append(y)
+        if self.links:
+            self.direction.append(_CODES[direction])
+            self.parent.append(parent or 0)
+        if self._index is not None:
+            self._index.add(len(self.n) - 1)
+        if self._metrics is not None:
+            self._metrics.add(n, x, y)
+        if self.stats is not None:
+            self.stats.placed(n, x, y)
+
+    def append(self, square) -> None:
+        if self.links:
+            self.add(square.n, square.x, square.y, square.direction, square.parent)
+        else:
+            self.add(square.n, square.x, square.y)
+
+    def extend(self, squares) -> None:
+        for square in squares:
+            self.append(square)
+
+    def keep_last(self) -> None:
+        """Keep only the most recent square from now on.
+
+        Building can go on (it needs just the last square), but queries,
+        metrics and saving no longer see the earlier squares.
+        """
+        self.keep = False
+        self._index = None
+        self._drop(1)
+
+    def _drop(self, last: int = 0) -> None:
+        # leave the final ``last`` entries of every column
+        cut = len(self.n) - last
+        if cut <= 0:
+            return
+        del self.n[:cut], self.x[:cut], self.y[:cut]
+        if self.links:
+            del self.direction[:cut], self.parent[:cut]
+
+    def spatial(self) -> SquareIndex:
+        if not self.keep:
+            raise ValueError("the store keeps only its last square")
+        if self._index is None:
+            self._index = SquareIndex(self)
+        return self._index
+
+    def query_rect(self, x0, y0, x1, y1, max_n: Optional[int] = None) -> List:
+        """Squares overlapping the box ``[x0, x1] x [y0, y1]``, by ``n``,
+        leaving out those numbered above ``max_n``."""
+        indices = self.spatial().query_rect(x0, y0, x1, y1, max_n)
+        return [self._make(i) for i in indices]
+
+    def locate(self, x, y):
+        """The square covering ``(x, y)`` (left and bottom edges included)."""
+        i = self.spatial().locate(x, y)
+        return None if i is None else self._make(i)
+
+    def metrics(self) -> MetricsSnapshot:
+        if self._metrics is None:
+            self._metrics = Metrics()
+            for n, x, y in zip(self.n, self.x, self.y):
+                self._metrics.add(n, x, y)
+        return self._metrics.snapshot()
+
+    def side(self, index: int) -> Fraction:
+        return Fraction(1, self.n[index])
+
+    def __len__(self) -> int:
+        return len(self.n)
+
+    def _make(self, i: int):
+        n = self.n[i]
+        if self.links:
+            return self._record(
+                n,
+                Fraction(1, n),
+                self.x[i],
+                self.y[i],
+                _DIRECTIONS[self.direction[i]],
+                self.parent[i] or None,
+            )
+        return self._record(n, Fraction(1, n), self.x[i], self.y[i])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._make(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("square index out of range")
+        return self._make(index)
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self)):
+            yield self._make(i)
+
+
+class StoredSquares:
+    """What a stack gets from keeping its squares in ``self.squares``.
+
+    ``build`` and ``iter_build`` place squares one at a time with the
+    stack's ``add_square(n)``, continuing after the last stored square.
+    Queries, metrics, profiling and persistence all go through the
+    ``SquareStore``.  Stacks with placement state beyond their squares
+    override ``_state`` (a JSON-able dict) and ``_restore``, which
+    ``algorithms.persist`` uses to write and rebuild them.
+    """
+
+    squares: SquareStore
+
+    def build(self, count: int) -> None:
+        for n in range(self.squares.n[-1] + 1, count + 1):
+            self.add_square(n)
+
+    def iter_build(self, count: Optional[int] = None) -> Iterator:
+        """Extend the stack to ``count`` squares (without end if ``None``),
+        yielding each new square as soon as it is placed."""
+        n = self.squares.n[-1] + 1
+        while count is None or n <= count:
+            self.add_square(n)
+            yield self.squares[-1]
+            n += 1
+
+    @property
+    def metrics(self) -> MetricsSnapshot:
+        """Ground length, alpha, bounding box, area and column heights so far.
+
+        The first access scans the squares; after that every placement
+        updates the metrics as it happens.
+        """
+        return self.squares.metrics()
+
+    def query_rect(self, x0, y0, x1, y1) -> List:
+        """Placed squares overlapping ``[x0, x1] x [y0, y1]`` (exact)."""
+        return self.squares.query_rect(x0, y0, x1, y1)
+
+    def locate(self, x, y):
+        """The placed square covering the point ``(x, y)``, if any."""
+        return self.squares.locate(x, y)
+
+    def profile(self, interval: int = 1000) -> BuildStats:
+        """Start collecting ``stats`` for the squares placed from now on."""
+        self.squares.stats = BuildStats(interval)
+        return self.squares.stats
+
+    @property
+    def stats(self) -> Optional[BuildStats]:
+        """Hot-path counters and timings since ``profile()``, else ``None``."""
+        return self.squares.stats
+
+    def _state(self) -> dict:
+        return {}
+
+    def _restore(self, squares: SquareStore, state: dict) -> None:
+        self.squares = squares
+
+    def save(self, path: str) -> None:
+        """Write the stack to ``path`` (see ``algorithms.persist``)."""
+        from . import persist
+
+        persist.save(self, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Read a stack written by ``save``; ``build`` continues from it."""
+        from . import persist
+
+        return persist.load(path, cls)
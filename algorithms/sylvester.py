@@ -3,6 +3,11 @@ from dataclasses import dataclass
 from fractions import Fraction
 from typing import List, Optional
 
+from .corners import CornerIndex
+from .numeric import backend
+from .skyline import Skyline
+from .store import SquareStore, StoredSquares
+
 @dataclass
 class Square:
     n: int
@@ -19,75 +24,101 @@ class Corner:
     left_is_wall: bool
     bottom_is_ground: bool
 
-class Stack:
+class Stack(StoredSquares):
     """Corner-based Sylvester stack.  ``open_bounds=True`` leaves a small gap
     above each square.  ``open_bounds=False`` packs squares flush against their
-    supports."""
+    supports.
+
+    ``numeric="float"`` runs the corner search on float64 approximations and
+    only falls back to exact ``Fraction`` comparisons for near ties; the
+    placements are identical to ``numeric="exact"`` and ``exact_fallbacks``
+    counts how often the exact path was taken.  ``numeric="integer"`` keeps
+    every coordinate as an integer over one shared denominator instead."""
 
-    def __init__(self, strict: bool = True, open_bounds: bool = True) -> None:
+    def __init__(
+        self, strict: bool = True, open_bounds: bool = True, numeric: str = "exact"
+    ) -> None:
         if not strict:
             raise NotImplementedError("Relaxed support not implemented")
         self.strict = True
         self.open_bounds = open_bounds
-        self.squares: List[Square] = [Square(1, Fraction(1), Fraction(0), Fraction(0))]
-        self.segments: List[tuple[Fraction, Fraction, Fraction]] = [
-            (Fraction(0), Fraction(1), Fraction(1))
-        ]
-        self.corners: List[Corner] = [
-            Corner(
-                Fraction(1),
-                Fraction(0),
-                Fraction(1),
-                None,
-                False,
-                True,
-            )
-        ]
+        self.numeric = numeric
+        self._num = backend(numeric)
+        zero = self._num.zero
+        one = self._num.one
+        self.squares = SquareStore(Square)
+        self.squares.add(1, Fraction(0), Fraction(0))
+        self.segments = Skyline([(zero, one, one)], zero=zero)
+        self.corners = CornerIndex(
+            [
+                Corner(
+                    one,
+                    zero,
+                    one,
+                    None,
+                    False,
+                    True,
+                )
+            ]
+        )
+
+    @property
+    def exact_fallbacks(self) -> int:
+        """Number of comparisons the float mode had to settle exactly."""
+        return self._num.fallbacks
 
-    def _merge(self) -> None:
-        self.segments.sort()
+    def _rescale(self, factor: int) -> None:
+        self.segments.rescale(factor)
+        self.corners.rescale(factor)
 
     def _insert_segment(self, left: Fraction, right: Fraction, height: Fraction) -> None:
-        new_segments: List[tuple[Fraction, Fraction, Fraction]] = []
-        for l, r, h in self.segments:
-            if r <= left or l >= right:
-                new_segments.append((l, r, h))
-            else:
-                if l < left:
-                    new_segments.append((l, left, h))
-                if r > right:
-                    new_segments.append((right, r, h))
-        new_segments.append((left, right, height))
-        self.segments = new_segments
+        self.segments.insert(left, right, height)
+
+    def _fits(self, c: Corner, side: Fraction, ceiling: Fraction) -> bool:
+        # ``ceiling`` is ``1 - side``: the highest bottom that keeps the
+        # square's top at or below y=1.
+        if c.hspan is not None and side > c.hspan:
+            return False
+        if side > c.vspan:
+            return False
+        if self.open_bounds:
+            if c.bottom >= ceiling:
+                return False
+        elif c.bottom > ceiling:
+            return False
+        if self.open_bounds:
+            if not c.bottom_is_ground and c.hspan is not None and side == c.hspan:
+                return False
+            if not c.left_is_wall and side == c.vspan:
+                return False
+        return True
 
     def add_square(self, n: int) -> None:
-        side = Fraction(1, n)
-        for i, c in enumerate(self.corners):
-            if c.hspan is not None and side > c.hspan:
-                continue
-            if side > c.vspan:
-                continue
-            top = c.bottom + side
-            if top > 1 or (self.open_bounds and top == 1):
-                continue
-            if self.open_bounds:
-                if not c.bottom_is_ground and c.hspan is not None and side == c.hspan:
-                    continue
-                if not c.left_is_wall and side == c.vspan:
-                    continue
-            break
+        stats = self.squares.stats
+        factor = self._num.grow(n)
+        if factor is not None:
+            self._rescale(factor)
+            if stats is not None:
+                stats.count("rescales")
+        side = self._num.side(n)
+        ceiling = self._num.one - side
+        if stats is None:
+            fits = lambda corner: self._fits(corner, side, ceiling)
         else:
-            raise RuntimeError("no position found")
+
+            def fits(corner: Corner) -> bool:
+                stats.count("corners_scanned")
+                return self._fits(corner, side, ceiling)
+
+        i, c = self.corners.find(side, ceiling, not self.open_bounds, fits)
         x = c.x
         bottom = c.bottom
-        self.squares.append(Square(n, side, x, bottom))
+        exact = self._num.exact
+        self.squares.add(n, exact(x), exact(bottom))
         self._insert_segment(x, x + side, bottom + side)
-        self._merge()
-        self.corners.pop(i)
-        idx = i
+        replacement: List[Corner] = []
         if c.vspan > side:
-            self.corners.insert(
-                idx,
+            replacement.append(
                 Corner(
                     x,
                     bottom + side,
@@ -95,16 +126,14 @@ class Stack:
                     side,
                     c.left_is_wall,
                     False,
-                ),
+                )
             )
-            idx += 1
         if c.hspan is None:
             new_hspan = None
         else:
             new_hspan = c.hspan - side
         if new_hspan is None or new_hspan > 0:
-            self.corners.insert(
-                idx,
+            replacement.append(
                 Corner(
                     x + side,
                     bottom,
@@ -112,12 +141,49 @@ class Stack:
                     new_hspan,
                     False,
                     c.bottom_is_ground,
-                ),
+                )
             )
+        self.corners.replace(i, replacement)
+
+    def _state(self) -> dict:
+        exact = self._num.exact
+        return {
+            "segments": [(exact(l), exact(r), exact(h)) for l, r, h in self.segments],
+            "corners": [
+                (
+                    exact(c.x),
+                    exact(c.bottom),
+                    exact(c.vspan),
+                    None if c.hspan is None else exact(c.hspan),
+                    c.left_is_wall,
+                    c.bottom_is_ground,
+                )
+                for c in self.corners
+            ],
+        }
 
-    def build(self, count: int) -> None:
-        for n in range(2, count + 1):
-            self.add_square(n)
+    def _restore(self, squares: SquareStore, state: dict) -> None:
+        num = self._num
+        num.grow(squares.n[-1])
+        value = num.value
+        self.squares = squares
+        self.segments = Skyline(
+            [(value(l), value(r), value(h)) for l, r, h in state["segments"]],
+            zero=num.zero,
+        )
+        self.corners = CornerIndex(
+            [
+                Corner(
+                    value(x),
+                    value(bottom),
+                    value(vspan),
+                    None if hspan is None else value(hspan),
+                    left_is_wall,
+                    bottom_is_ground,
+                )
+                for x, bottom, vspan, hspan, left_is_wall, bottom_is_ground in state["corners"]
+            ]
+        )
 
     def summary(self) -> str:
         lines = []
@@ -127,6 +193,10 @@ class Stack:
 
 if __name__ == "__main__":
     import argparse
+    import sys
+
+    from .export import add_arguments, export
+    from . import stats
 
     parser = argparse.ArgumentParser(
         description="Simulate Sylvester square stacking (corner version)"
@@ -137,8 +207,21 @@ if __name__ == "__main__":
         action="store_true",
         help="pack squares flush against their supports",
     )
+    parser.add_argument(
+        "--numeric",
+        choices=["exact", "float", "integer"],
+        default="exact",
+        help="arithmetic for the corner search (results are identical)",
+    )
+    add_arguments(parser)
+    stats.add_arguments(parser)
     args = parser.parse_args()
 
-    stack = Stack(strict=True, open_bounds=not args.fill)
+    stack = Stack(strict=True, open_bounds=not args.fill, numeric=args.numeric)
+    if stats.requested(args):
+        stack.profile()
     stack.build(args.N)
-    print(stack.summary())
+    export(stack, args.output, args.format, args.digits)
+    stats.emit(stack.stats, args.profile_json)
+    if args.numeric == "float":
+        print(f"exact fallbacks: {stack.exact_fallbacks}", file=sys.stderr)
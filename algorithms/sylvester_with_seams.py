@@ -1,7 +1,12 @@
 from __future__ import annotations
+from bisect import insort
 from fractions import Fraction
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+
+from .numeric import backend
+from .skyline import Skyline
+from .store import SquareStore, StoredSquares
 
 @dataclass
 class Square:
@@ -10,71 +15,79 @@ class Square:
     x: Fraction
     y: Fraction  # bottom coordinate
 
-class Stack:
-    def __init__(self, strict: bool = True, open_bounds: bool = False):
+class Stack(StoredSquares):
+    def __init__(
+        self, strict: bool = True, open_bounds: bool = False, numeric: str = "exact"
+    ):
         self.strict = strict
         self.open_bounds = open_bounds
-        self.squares: List[Square] = [Square(1, Fraction(1), Fraction(0), Fraction(0))]
-        self.segments: List[Tuple[Fraction, Fraction, Fraction]] = [
-            (Fraction(0), Fraction(1), Fraction(1))
-        ]
-
-    # merge overlapping segments; adjacent segments of the same height are
-    # merged only in the relaxed variant so that the strict version keeps
-    # track of individual supports.
-    def _merge(self):
-        # Only sort segments.  We deliberately keep adjacent segments
-        # separate so that strict support can detect them.
-        self.segments.sort()
+        # ``numeric="float"`` settles comparisons in float64 where the result
+        # is certain and falls back to exact arithmetic otherwise;
+        # ``numeric="integer"`` stores integers over a shared denominator.
+        self.numeric = numeric
+        self._num = backend(numeric)
+        zero = self._num.zero
+        one = self._num.one
+        self.squares = SquareStore(Square)
+        # right edge x-coordinate -> sorted vertical intervals touching it
+        self._right_edges: Dict[Fraction, List[Tuple[Fraction, Fraction]]] = {}
+        self.segments = Skyline([(zero, one, one)], zero=zero, wall=self._wall)
+        self._append(1, one, zero, zero)
+
+    @property
+    def exact_fallbacks(self) -> int:
+        """Number of comparisons the float mode had to settle exactly."""
+        return self._num.fallbacks
+
+    def _rescale(self, factor: int) -> None:
+        self.segments.rescale(factor)
+        self._right_edges = {
+            x * factor: [(l * factor, r * factor) for l, r in intervals]
+            for x, intervals in self._right_edges.items()
+        }
+
+    def _append(self, n: int, side: Fraction, x: Fraction, y: Fraction) -> None:
+        exact = self._num.exact
+        self.squares.add(n, exact(x), exact(y))
+        self._add_right_edge(side, x, y)
+
+    def _add_right_edge(self, side: Fraction, x: Fraction, y: Fraction) -> None:
+        intervals = self._right_edges.setdefault(x + side, [])
+        insort(intervals, (y, y + side))
 
     # top surface height at position x
     def _top(self, x: Fraction) -> Fraction:
-        for l, r, h in self.segments:
-            if l <= x < r:
-                return h
-        return Fraction(0)
+        return self.segments.height_at(x)
 
     # segments covering [start, end)
     def _segments_between(
         self, start: Fraction, end: Fraction, clip: bool = True
     ) -> List[Tuple[Fraction, Fraction, Fraction]]:
-        segs: List[Tuple[Fraction, Fraction, Fraction]] = []
-        for l, r, h in self.segments:
-            if r <= start or l >= end:
-                continue
-            if clip:
-                segs.append((max(l, start), min(r, end), h))
-            else:
-                segs.append((l, r, h))
-        segs.sort()
+        segs = self.segments.between(start, end)
         if not clip:
             return segs
-        # fill gaps with ground
+        # clip to [start, end) and fill gaps with ground
         result: List[Tuple[Fraction, Fraction, Fraction]] = []
         coverage = start
         for l, r, h in segs:
+            l = max(l, start)
             if l > coverage:
-                result.append((coverage, l, Fraction(0)))
-            result.append((l, r, h))
-            coverage = r
+                result.append((coverage, l, self._num.zero))
+            coverage = min(r, end)
+            result.append((l, coverage, h))
         if coverage < end:
-            result.append((coverage, end, Fraction(0)))
+            result.append((coverage, end, self._num.zero))
         return result
 
     def _support_height(self, start: Fraction, side: Fraction) -> Fraction:
-        segs = self._segments_between(start, start + side)
-        return max(h for _, _, h in segs)
+        return self.segments.max_height(start, start + side)
 
     def _is_supported(self, start: Fraction, side: Fraction, bottom: Fraction) -> bool:
         end = start + side
         segs = []
         coverage = start
         right_extent = None
-        for l, r, h in self.segments:
-            if r <= coverage:
-                continue
-            if l >= end:
-                break
+        for l, r, h in self.segments.between(start, end):
             seg_left = max(l, start)
             seg_right = min(r, end)
             if seg_left > coverage:
@@ -87,22 +100,35 @@ class Stack:
                 right_extent = r
         if coverage < end:
             return False
-        if self.open_bounds and bottom != Fraction(0):
+        if self.open_bounds and bottom != self._num.zero:
             if right_extent is None or right_extent <= end:
                 return False
         if self.strict:
             return len(segs) == 1
         return True
 
+    def _wall(self, x: Fraction, bottom: Fraction) -> Fraction:
+        """How far the left edge at ``x`` is covered upwards from ``bottom``
+        (an upper bound for the squares ``_is_left_supported`` accepts)."""
+        if x == self._num.zero:
+            intervals = [(self._num.zero, self._num.one)]
+        else:
+            intervals = self._right_edges.get(x, [])
+        coverage = bottom
+        for l, r in intervals:
+            if r <= coverage:
+                continue
+            if l > coverage:
+                break
+            coverage = r
+        return coverage - bottom
+
     def _is_left_supported(self, x: Fraction, side: Fraction, bottom: Fraction) -> bool:
         """Check that the entire left edge at position x is covered."""
-        intervals: List[Tuple[Fraction, Fraction]] = []
-        if x == 0:
-            intervals.append((Fraction(0), Fraction(1)))
-        for b in self.squares:
-            if b.x + b.side == x:
-                intervals.append((b.y, b.y + b.side))
-        intervals.sort()
+        if x == self._num.zero:
+            intervals = [(self._num.zero, self._num.one)]
+        else:
+            intervals = self._right_edges.get(x, [])
         target_top = bottom + side
         coverage = bottom
         top_extent = None
@@ -118,7 +144,7 @@ class Stack:
             coverage = r
         if coverage < target_top:
             return False
-        if self.open_bounds and x != Fraction(0):
+        if self.open_bounds and x != self._num.zero:
             if top_extent is None or top_extent <= target_top:
                 return False
         if self.strict:
@@ -130,36 +156,60 @@ class Stack:
         return True
 
     def _next_boundary(self, x: Fraction) -> Fraction:
-        boundaries = sorted({l for l, _, _ in self.segments} | {r for _, r, _ in self.segments})
-        for b in boundaries:
-            if b > x:
-                return b
-        return x
+        if self.squares.stats is not None:
+            self.squares.stats.count("next_boundary_calls")
+        b = self.segments.next_boundary(x)
+        return x if b is None else b
+
+    def _advance(self, x: Fraction, side: Fraction, limit: Fraction) -> Fraction:
+        """The next position to try once ``x`` is turned down (``x`` itself if
+        there is none).
+
+        A square only rests on a segment with room for it (see ``_wall`` and
+        ``Skyline``) that is no higher than ``limit``, so the slide may jump
+        to the next such segment (or past the last one), provided nothing in
+        between is lower than the support there: the positions skipped would
+        all be turned down and leave ``bottom`` where that support puts it
+        anyway.
+        """
+        next_x = self._next_boundary(x)
+        target = self.segments.next_room(x, side, limit)
+        if target is None:
+            target = self.segments.rights[-1]
+            support = self._num.zero
+        else:
+            support = self._support_height(target, side)
+        if target > next_x and self.segments.min_height(x, target) >= support:
+            if self.squares.stats is not None:
+                self.squares.stats.count("jumps")
+            return target
+        return next_x
 
     def _insert_segment(self, left: Fraction, right: Fraction, height: Fraction) -> None:
-        new_segments: List[Tuple[Fraction, Fraction, Fraction]] = []
-        for l, r, h in self.segments:
-            if r <= left or l >= right:
-                new_segments.append((l, r, h))
-            else:
-                if l < left:
-                    new_segments.append((l, left, h))
-                if r > right:
-                    new_segments.append((right, r, h))
-        new_segments.append((left, right, height))
-        self.segments = new_segments
+        self.segments.insert(left, right, height)
 
     def add_square(self, n: int):
-        side = Fraction(1, n)
-        x = Fraction(0)
-        bottom = Fraction(1)
+        stats = self.squares.stats
+        factor = self._num.grow(n)
+        if factor is not None:
+            self._rescale(factor)
+            if stats is not None:
+                stats.count("rescales")
+        side = self._num.side(n)
+        one = self._num.one
+        x = self._num.zero
+        bottom = one
+        highest = one - side
         while True:
+            if stats is not None:
+                stats.count("candidates")
+                stats.count("segments_touched", self.segments.count_between(x, x + side))
             support = self._support_height(x, side)
             if bottom > support:
                 bottom = support
             top = bottom + side
-            if (top > 1) or (self.open_bounds and top == 1):
-                next_x = self._next_boundary(x)
+            if (top > one) or (self.open_bounds and top == one):
+                next_x = self._advance(x, side, bottom if bottom < highest else highest)
                 if next_x == x:
                     bottom = support
                     break
@@ -167,19 +217,36 @@ class Stack:
                 continue
             if self._is_supported(x, side, bottom) and self._is_left_supported(x, side, bottom):
                 break
-            next_x = self._next_boundary(x)
+            next_x = self._advance(x, side, bottom if bottom < highest else highest)
             if next_x == x:
                 bottom = support
                 break
             x = next_x
-        self.squares.append(Square(n, side, x, bottom))
+        self._append(n, side, x, bottom)
         # insert new segment and remove covered pieces of older segments
         self._insert_segment(x, x + side, bottom + side)
-        self._merge()
 
-    def build(self, count: int):
-        for n in range(2, count + 1):
-            self.add_square(n)
+    def _state(self) -> dict:
+        exact = self._num.exact
+        return {
+            "segments": [(exact(l), exact(r), exact(h)) for l, r, h in self.segments]
+        }
+
+    def _restore(self, squares: SquareStore, state: dict) -> None:
+        num = self._num
+        num.grow(squares.n[-1])
+        value = num.value
+        self.squares = squares
+        # the right-edge index is derived from the squares (and needed by
+        # the skyline's walls)
+        self._right_edges = {}
+        for n, x, y in zip(squares.n, squares.x, squares.y):
+            self._add_right_edge(num.side(n), value(x), value(y))
+        self.segments = Skyline(
+            [(value(l), value(r), value(h)) for l, r, h in state["segments"]],
+            zero=num.zero,
+            wall=self._wall,
+        )
 
     def summary(self) -> str:
         lines = []
@@ -191,12 +258,29 @@ class Stack:
 
 if __name__ == "__main__":
     import argparse
+    import sys
+
+    from .export import add_arguments, export
+    from . import stats
 
     parser = argparse.ArgumentParser(description="Simulate Sylvester square stacking (cover seams)")
     parser.add_argument("N", type=int, nargs="?", default=10, help="number of squares to simulate")
     parser.add_argument("--fill-cover-seams", action="store_true", help="dummy flag for compatibility")
+    parser.add_argument(
+        "--numeric",
+        choices=["exact", "float", "integer"],
+        default="exact",
+        help="arithmetic for the placement search (results are identical)",
+    )
+    add_arguments(parser)
+    stats.add_arguments(parser)
     args = parser.parse_args()
 
-    stack = Stack(strict=False, open_bounds=False)
+    stack = Stack(strict=False, open_bounds=False, numeric=args.numeric)
+    if stats.requested(args):
+        stack.profile()
     stack.build(args.N)
-    print(stack.summary())
+    export(stack, args.output, args.format, args.digits)
+    stats.emit(stack.stats, args.profile_json)
+    if args.numeric == "float":
+        print(f"exact fallbacks: {stack.exact_fallbacks}", file=sys.stderr)
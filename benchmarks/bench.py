@@ -0,0 +1,240 @@
+from __future__ import annotations
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tools.render_stack import make_stack, render
+
+# Scaling benchmarks for the stacks and renderers.
+#
+#   python -m benchmarks.bench run --output baseline.json
+#   python -m benchmarks.bench compare baseline.json current.json
+#
+# ``run`` times ``build(N)`` for every algorithm and variant over a geometric
+# range of N, fits the exponent k of ``time ~ N**k`` by least squares on the
+# log-log points, and records the peak traced allocation of each build.  It
+# also times the renderers on one fixed stack.  ``compare`` flags every
+# measurement that got slower, or allocated more at its peak, than the
+# threshold allows.
+
+# name -> (make_stack arguments, largest N); the seams variant is far slower
+# than the others, so it gets a smaller range
+BUILDS: Dict[str, Tuple[dict, int]] = {
+    "sylvester": ({"algo": "sylvester"}, 16384),
+    "sylvester-fill": ({"algo": "sylvester", "fill": True}, 16384),
+    "sylvester-fill-cover-seams": (
+        {"algo": "sylvester", "fill_cover_seams": True},
+        512,
+    ),
+    "erdos": ({"algo": "erdos"}, 65536),
+    "rational": ({"algo": "rational"}, 65536),
+}
+
+# name -> (format, scale, coverage) rendered from a rational stack
+RENDERS: Dict[str, Tuple[str, int, bool]] = {
+    "svg": ("svg", 400, False),
+    "svgz": ("svgz", 400, False),
+    "ppm@200": ("ppm", 200, False),
+    "ppm@400": ("ppm", 400, False),
+    "p6@800": ("p6", 800, False),
+    "png@800": ("png", 800, False),
+    "png-coverage@400": ("png", 400, True),
+}
+RENDER_SIZE = 2047
+
+
+def sizes(smallest: int, largest: int, factor: int = 4) -> List[int]:
+    result = []
+    n = smallest
+    while n <= largest:
+        result.append(n)
+        n *= factor
+    return result
+
+
+def fit_exponent(counts: List[int], seconds: List[float]) -> Optional[float]:
+    """Least-squares slope of ``log(seconds)`` against ``log(count)``."""
+    points = [(math.log(n), math.log(t)) for n, t in zip(counts, seconds) if t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+
+def _best_time(action: Callable[[], None], repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_kb(action: Callable[[], None]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        action()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_builds(scale: float = 1.0, repeat: int = 3, memory: bool = True) -> Dict[str, dict]:
+    results = {}
+    for name, (options, largest) in BUILDS.items():
+        # at least two points, so there is an exponent to fit
+        counts = sizes(64, max(256, int(largest * scale)))
+
+        def build(count):
+            make_stack(**options).build(count)
+
+        seconds = []
+        peaks = []
+        for count in counts:
+            seconds.append(_best_time(lambda: build(count), repeat))
+            if memory:
+                peaks.append(_peak_kb(lambda: build(count)))
+        exponent = fit_exponent(counts, seconds)
+        results[f"build/{name}"] = {
+            "sizes": counts,
+            "seconds": seconds,
+            "peak_kb": peaks if memory else None,
+            "exponent": exponent,
+        }
+        print(
+            f"build/{name}: {seconds[-1]:.3f}s at N={counts[-1]}, exponent {exponent}",
+            file=sys.stderr,
+        )
+    return results
+
+
+def bench_renders(repeat: int = 3, memory: bool = True) -> Dict[str, dict]:
+    stack = make_stack("rational")
+    stack.build(RENDER_SIZE)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (image_format, scale, coverage) in RENDERS.items():
+            path = os.path.join(directory, "bench." + image_format)
+
+            def draw():
+                render(stack, image_format, path, scale=scale, coverage=coverage, numbers=False)
+
+            seconds = _best_time(draw, repeat)
+            results[f"render/{name}"] = {
+                "sizes": [RENDER_SIZE],
+                "seconds": [seconds],
+                "peak_kb": [_peak_kb(draw)] if memory else None,
+                "exponent": None,
+            }
+            print(f"render/{name}: {seconds:.3f}s", file=sys.stderr)
+    return results
+
+
+def run(scale: float = 1.0, repeat: int = 3, memory: bool = True) -> dict:
+    results = bench_builds(scale, repeat, memory)
+    results.update(bench_renders(repeat, memory))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scale": scale,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2) -> List[str]:
+    """Lines describing every measurement slower, or with a peak allocation
+    larger, by more than ``threshold`` (a fraction) in ``current``, plus
+    exponents that grew by over 0.1.  Peaks are compared only where both
+    reports recorded them."""
+    regressions = []
+    old_results = baseline["results"]
+    for key, new in current["results"].items():
+        old = old_results.get(key)
+        if old is None:
+            continue
+        old_times = dict(zip(old["sizes"], old["seconds"]))
+        for count, seconds in zip(new["sizes"], new["seconds"]):
+            before = old_times.get(count)
+            if before and seconds > before * (1 + threshold):
+                regressions.append(
+                    f"{key} N={count}: {before:.4f}s -> {seconds:.4f}s "
+                    f"(+{100 * (seconds / before - 1):.0f}%)"
+                )
+        if old["peak_kb"] is not None and new["peak_kb"] is not None:
+            old_peaks = dict(zip(old["sizes"], old["peak_kb"]))
+            for count, peak in zip(new["sizes"], new["peak_kb"]):
+                before = old_peaks.get(count)
+                if before and peak > before * (1 + threshold):
+                    regressions.append(
+                        f"{key} N={count}: peak {before} KiB -> {peak} KiB "
+                        f"(+{100 * (peak / before - 1):.0f}%)"
+                    )
+        if old["exponent"] is not None and new["exponent"] is not None:
+            if new["exponent"] > old["exponent"] + 0.1:
+                regressions.append(
+                    f"{key}: exponent {old['exponent']:.2f} -> {new['exponent']:.2f}"
+                )
+    return regressions
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark stack builds and renderers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="measure and write a JSON report")
+    run_parser.add_argument("--output", default="benchmark.json", help="JSON file to write")
+    run_parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="fraction of the default largest N per build (e.g. 0.1 for a quick run)",
+    )
+    run_parser.add_argument("--repeat", type=int, default=3, help="timings per point (best is kept)")
+    run_parser.add_argument("--no-memory", action="store_true", help="skip peak memory runs")
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline", help="baseline JSON report")
+    compare_parser.add_argument("current", help="JSON report to check")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed slowdown or peak memory growth as a fraction (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.scale, args.repeat, not args.no_memory)
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+        return
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    with open(args.current) as fh:
+        current = json.load(fh)
+    regressions = compare(baseline, current, args.threshold)
+    for line in regressions:
+        print(line)
+    if regressions:
+        sys.exit(1)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
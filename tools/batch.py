@@ -0,0 +1,162 @@
+from __future__ import annotations
+import itertools
+import json
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tools.render_stack import _EXTENSIONS, make_stack, render
+
+# Batch rendering for the nightly matrix of algorithms, variants, sizes and
+# formats.  Jobs that share an (algo, variant) pair run in one worker process:
+# the stack is built once, extended through the sizes in increasing order,
+# and every job renders the prefix it asked for as soon as the stack reaches
+# it.  Different pairs run in parallel on a process pool, each in a fresh
+# worker process so that its memory peak is its own.
+
+# ``variant`` names the ``tools/render_stack`` flags it stands for; only the
+# sylvester algorithm has variants besides ``plain``
+VARIANTS = {
+    "plain": {},
+    "fill": {"fill": True},
+    "fill-cover-seams": {"fill_cover_seams": True},
+}
+
+
+@dataclass(frozen=True)
+class Job:
+    algo: str
+    variant: str
+    count: int
+    image_format: str
+
+    def filename(self, directory: str) -> str:
+        name = f"{self.algo}-{self.variant}-{self.count}.{_EXTENSIONS[self.image_format]}"
+        return os.path.join(directory, name)
+
+
+@dataclass
+class Result:
+    job: Job
+    output: str
+    build_seconds: float  # time spent extending the shared stack to this job
+    render_seconds: float
+    peak_rss_kb: int  # peak resident memory of the group's process up to this job
+
+
+def _run_group(
+    algo: str, variant: str, jobs: List[Job], directory: str, options: dict
+) -> List[Result]:
+    stack = make_stack(algo, **VARIANTS[variant])
+    results = []
+    for job in sorted(jobs, key=lambda job: job.count):
+        start = time.perf_counter()
+        stack.build(job.count)
+        built = time.perf_counter()
+        output = job.filename(directory)
+        render(stack, job.image_format, output, **options)
+        done = time.perf_counter()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results.append(Result(job, output, built - start, done - built, peak))
+    return results
+
+
+def matrix(
+    algos: List[str], variants: List[str], counts: List[int], formats: List[str]
+) -> List[Job]:
+    """Every combination, skipping variants that do not apply to an algorithm."""
+    jobs = []
+    for algo, variant, count, image_format in itertools.product(
+        algos, variants, counts, formats
+    ):
+        if variant != "plain" and algo != "sylvester":
+            continue
+        jobs.append(Job(algo, variant, count, image_format))
+    return jobs
+
+
+def run(
+    jobs: List[Job], directory: str = ".", workers: Optional[int] = None, **options
+) -> List[Result]:
+    """Run ``jobs`` on a process pool and return their results in job order.
+
+    ``options`` are passed to ``tools.render_stack.render``.
+    """
+    os.makedirs(directory, exist_ok=True)
+    groups: Dict[Tuple[str, str], List[Job]] = {}
+    for job in jobs:
+        groups.setdefault((job.algo, job.variant), []).append(job)
+    by_job: Dict[Job, Result] = {}
+    # one task per worker process: ru_maxrss never goes down, so a reused
+    # worker would report the peak of whatever group it ran before
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        futures = [
+            pool.submit(_run_group, algo, variant, group, directory, options)
+            for (algo, variant), group in groups.items()
+        ]
+        for future in as_completed(futures):
+            for result in future.result():
+                by_job[result.job] = result
+    return [by_job[job] for job in jobs]
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Render a matrix of stacks in parallel"
+    )
+    parser.add_argument(
+        "--algos",
+        nargs="+",
+        default=["sylvester", "erdos", "rational"],
+        help="algorithms (module names in algorithms)",
+    )
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        choices=sorted(VARIANTS),
+        default=["plain"],
+        help="sylvester variants; other algorithms only run 'plain'",
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[100], help="numbers of squares"
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=["svg", "svgz", "ppm", "p6", "png"],
+        default=["svg"],
+        help="output formats",
+    )
+    parser.add_argument("--output-dir", default="batch", help="directory for the images")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--no-numbers", action="store_true", help="omit square numbers")
+    parser.add_argument("--report", help="also write the timings as JSON to this file")
+    args = parser.parse_args()
+
+    jobs = matrix(args.algos, args.variants, args.sizes, args.formats)
+    if not jobs:
+        parser.error("the matrix is empty")
+    started = time.perf_counter()
+    results = run(
+        jobs, args.output_dir, args.workers, numbers=not args.no_numbers
+    )
+    for r in results:
+        job = r.job
+        print(
+            f"{job.algo:<10} {job.variant:<17} {job.count:>9} {job.image_format:<4} "
+            f"build {r.build_seconds:8.2f}s  render {r.render_seconds:8.2f}s  "
+            f"peak {r.peak_rss_kb / 1024:8.1f} MiB  {r.output}"
+        )
+    print(f"total wall time {time.perf_counter() - started:.2f}s")
+    if args.report:
+        with open(args.report, "w") as fh:
+            json.dump([asdict(r) for r in results], fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
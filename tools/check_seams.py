@@ -0,0 +1,97 @@
+from __future__ import annotations
+from fractions import Fraction
+from itertools import product
+from typing import List, Optional, Tuple
+
+from algorithms import sylvester_with_seams
+from algorithms.numeric import NUMERIC_MODES
+
+# Regression check for the jumping slide of ``sylvester_with_seams``.
+#
+# ``Stack._advance`` skips ahead using ``Skyline.next_room``,
+# ``Skyline.min_height`` and ``Stack._wall`` instead of visiting every
+# skyline boundary.  Each variant and numeric mode is built twice, once as
+# is and once with ``_advance`` reduced to plain ``_next_boundary`` steps
+# (the slide before the jumps), and the placements must agree square by
+# square.
+#
+#   python -m tools.check_seams 300
+
+# (strict, open_bounds) as named by ``tools/diverge``
+VARIANTS = {
+    "strict:fill": (True, False),
+    "strict:open": (True, True),
+    "relaxed:fill": (False, False),
+    "relaxed:open": (False, True),
+}
+
+Placement = Tuple[int, Fraction, Fraction]
+
+
+class NaiveStack(sylvester_with_seams.Stack):
+    """The seams stack sliding one skyline boundary at a time."""
+
+    def _advance(self, x: Fraction, side: Fraction, limit: Fraction) -> Fraction:
+        return self._next_boundary(x)
+
+
+def placements(stack, count: int) -> List[Placement]:
+    stack.build(count)
+    return [(b.n, b.x, b.y) for b in stack.squares]
+
+
+def check(variant: str, numeric: str, count: int) -> Optional[str]:
+    """The first square the jumping slide places differently, described, or
+    ``None`` if all ``count`` squares agree."""
+    strict, open_bounds = VARIANTS[variant]
+    options = {"strict": strict, "open_bounds": open_bounds, "numeric": numeric}
+    fast = placements(sylvester_with_seams.Stack(**options), count)
+    naive = placements(NaiveStack(**options), count)
+    for got, want in zip(fast, naive):
+        if got != want:
+            n = want[0]
+            return (
+                f"{variant} {numeric}: n={n} placed at ({got[1]}, {got[2]}), "
+                f"the naive slide puts it at ({want[1]}, {want[2]})"
+            )
+    return None
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Check the seams slide against a boundary-by-boundary slide"
+    )
+    parser.add_argument(
+        "N", type=int, nargs="?", default=300, help="squares to place (default: 300)"
+    )
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        choices=sorted(VARIANTS),
+        default=sorted(VARIANTS),
+        help="strict/relaxed and fill/open combinations (default: all)",
+    )
+    parser.add_argument(
+        "--numeric",
+        nargs="+",
+        choices=sorted(NUMERIC_MODES),
+        default=sorted(NUMERIC_MODES),
+        help="numeric modes (default: all)",
+    )
+    args = parser.parse_args()
+    failures = 0
+    for variant, numeric in product(args.variants, args.numeric):
+        mismatch = check(variant, numeric, args.N)
+        if mismatch is None:
+            print(f"{variant} {numeric}: {args.N} squares agree")
+        else:
+            print(mismatch)
+            failures += 1
+    if failures:
+        parser.exit(1, f"{failures} mismatching combination(s)\n")
+
+
+if __name__ == "__main__":
+    main()
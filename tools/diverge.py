@@ -0,0 +1,199 @@
+from __future__ import annotations
+import importlib
+import multiprocessing as mp
+from fractions import Fraction
+from queue import Empty
+from typing import Dict, List, Optional, Tuple
+
+from algorithms.store import SquareStore
+from algorithms.sylvester import Square
+
+# Lockstep comparison of stack variants (docs/todo.md item 1).  Every variant
+# builds in its own worker process and streams its placements back in
+# batches; the parent compares them square by square and stops all workers at
+# the first square whose position differs.
+#
+# A variant is ``module[:option...]``.  The module is ``sylvester`` or
+# ``seams`` (``sylvester_with_seams``); options are ``strict``/``relaxed``
+# and ``open``/``fill`` (open or closed bounds).  The defaults are those of
+# ``tools/render_stack``: ``sylvester`` is strict and open,
+# ``seams`` is relaxed and filled.
+
+MODULES = {"sylvester": "sylvester", "seams": "sylvester_with_seams"}
+DEFAULTS = {
+    "sylvester": {"strict": True, "open_bounds": True},
+    "seams": {"strict": False, "open_bounds": False},
+}
+OPTIONS = {
+    "strict": ("strict", True),
+    "relaxed": ("strict", False),
+    "open": ("open_bounds", True),
+    "fill": ("open_bounds", False),
+}
+
+Placement = Tuple[int, Fraction, Fraction]
+
+
+def parse_variant(spec: str) -> Tuple[str, Dict[str, bool]]:
+    name, *options = spec.split(":")
+    if name not in MODULES:
+        raise ValueError(f"unknown variant {name!r}; choose from {sorted(MODULES)}")
+    kwargs = dict(DEFAULTS[name])
+    for option in options:
+        if option not in OPTIONS:
+            raise ValueError(f"unknown option {option!r}; choose from {sorted(OPTIONS)}")
+        key, value = OPTIONS[option]
+        kwargs[key] = value
+    return MODULES[name], kwargs
+
+
+def _worker(spec: str, count: int, queue, batch: int) -> None:
+    module_name, kwargs = parse_variant(spec)
+    module = importlib.import_module(f"algorithms.{module_name}")
+    try:
+        stack = module.Stack(**kwargs)
+    except NotImplementedError as exc:
+        queue.put(exc)
+        return
+    pending: List[Placement] = [(b.n, b.x, b.y) for b in stack.squares]
+    for square in stack.iter_build(count):
+        pending.append((square.n, square.x, square.y))
+        if len(pending) >= batch:
+            queue.put(pending)
+            pending = []
+    queue.put(pending)
+    queue.put(None)
+
+
+class Divergence:
+    """First square placed differently, with the squares around it."""
+
+    def __init__(
+        self,
+        n: int,
+        positions: Dict[str, Tuple[Fraction, Fraction]],
+        neighbours: List[Square],
+    ) -> None:
+        self.n = n
+        self.positions = positions
+        self.neighbours = neighbours
+
+    def report(self) -> str:
+        lines = [f"first divergence at n={self.n} (side 1/{self.n})"]
+        for spec, (x, y) in self.positions.items():
+            lines.append(f"  {spec}: left={x} bottom={y}")
+        lines.append("shared squares around the placements:")
+        for b in self.neighbours:
+            lines.append(f"  n={b.n}: left={b.x} bottom={b.y} side={b.side}")
+        return "\n".join(lines)
+
+
+def run(
+    specs: List[str], count: int, batch: int = 256, radius: int = 4
+) -> Optional[Divergence]:
+    """Build ``specs`` in lockstep up to ``count`` squares.
+
+    Returns the first ``Divergence``, or ``None`` if all variants agree.  The
+    neighbourhood lists the squares the variants share that lie within
+    ``radius`` sides of any of the diverging placements.
+    """
+    for spec in specs:
+        parse_variant(spec)
+    ctx = mp.get_context()
+    queues = [ctx.Queue(maxsize=64) for _ in specs]
+    workers = [
+        ctx.Process(target=_worker, args=(spec, count, queue, batch), daemon=True)
+        for spec, queue in zip(specs, queues)
+    ]
+    for worker in workers:
+        worker.start()
+    shared = SquareStore(Square)
+    buffers: List[List[Placement]] = [[] for _ in specs]
+    positions: List[int] = [0 for _ in specs]
+    try:
+        while True:
+            for i, queue in enumerate(queues):
+                if positions[i] >= len(buffers[i]):
+                    item = _receive(queue, workers[i], specs[i])
+                    if isinstance(item, Exception):
+                        raise RuntimeError(f"{specs[i]}: {item}")
+                    if item is None:
+                        return None
+                    buffers[i] = item
+                    positions[i] = 0
+            # compare as far as every variant has buffered placements
+            step = min(len(b) - p for b, p in zip(buffers, positions))
+            for k in range(step):
+                first = buffers[0][positions[0] + k]
+                for i in range(1, len(specs)):
+                    if buffers[i][positions[i] + k] != first:
+                        return _divergence(specs, buffers, positions, k, shared, radius)
+                shared.add(*first)
+            for i in range(len(specs)):
+                positions[i] += step
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def _receive(queue, worker, spec: str):
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if not worker.is_alive() and queue.empty():
+                raise RuntimeError(f"{spec}: worker exited with code {worker.exitcode}")
+
+
+def _divergence(specs, buffers, positions, k, shared, radius) -> Divergence:
+    placements = [buffers[i][positions[i] + k] for i in range(len(specs))]
+    n = placements[0][0]
+    reach = Fraction(radius, n)
+    seen: Dict[int, Square] = {}
+    for _, x, y in placements:
+        for b in shared.query_rect(x - reach, y - reach, x + reach, y + reach):
+            seen[b.n] = b
+    return Divergence(
+        n,
+        {spec: (x, y) for spec, (_, x, y) in zip(specs, placements)},
+        [seen[m] for m in sorted(seen)],
+    )
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Find the first square where stacking variants diverge"
+    )
+    parser.add_argument("N", type=int, help="largest square to compare")
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        default=["seams:strict", "seams:relaxed"],
+        help="variants as module[:option...], e.g. sylvester:fill or seams:relaxed:open",
+    )
+    parser.add_argument(
+        "--radius",
+        type=int,
+        default=4,
+        help="neighbourhood to report, in sides of the diverging square",
+    )
+    args = parser.parse_args()
+    if len(args.variants) < 2:
+        parser.error("compare at least two variants")
+    try:
+        found = run(args.variants, args.N, radius=args.radius)
+    except ValueError as exc:
+        parser.error(str(exc))
+    except RuntimeError as exc:
+        parser.exit(1, f"error: {exc}\n")
+    if found is None:
+        print(f"no divergence up to n={args.N}")
+    else:
+        print(found.report())
+
+
+if __name__ == "__main__":
+    main()
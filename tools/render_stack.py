@@ -1,8 +1,16 @@
 from __future__ import annotations
+from array import array
 from fractions import Fraction
-from typing import Tuple, List
-from decimal import Decimal, localcontext
+from itertools import chain, islice
+from math import ceil, floor
+from typing import BinaryIO, Iterable, Iterator, List, Optional, TextIO, Tuple
+import gzip
 import importlib
+import io
+import struct
+import zlib
+
+from algorithms import export, persist, stats
 
 # ``python -m`` executed from the repository root already puts the project on
 # ``sys.path``.  Additional path manipulation is unnecessary and has been
@@ -21,6 +29,15 @@ def load_stack(algo: str, strict: bool, open_bounds: bool) -> "Stack":
             return stack_class()
 
 
+def make_stack(algo: str, fill: bool = False, fill_cover_seams: bool = False) -> "Stack":
+    """Create the stack selected by ``--algo``, ``--fill`` and ``--fill-cover-seams``."""
+    if algo == "sylvester":
+        if fill_cover_seams:
+            return load_stack("sylvester_with_seams", strict=False, open_bounds=False)
+        return load_stack("sylvester", strict=True, open_bounds=not fill)
+    return load_stack(algo, strict=True, open_bounds=False)
+
+
 COLOR_PALETTE = [
     (51, 102, 204),  # blue
     (220, 57, 18),   # red
@@ -49,11 +66,17 @@ COLOR_PALETTE = [
 ]
 
 
-def _fmt(fr: Fraction) -> str:
-    """Format a Fraction as a high precision decimal string."""
-    with localcontext() as ctx:
-        ctx.prec = 50
-        return str(Decimal(fr.numerator) / Decimal(fr.denominator))
+# decimal places of the coordinates ``write_svg`` writes
+SVG_DIGITS = 24
+
+
+def _svg_numbers(pairs: List[Tuple[int, int]]) -> List[str]:
+    """A batch of ``(numerator, denominator)`` pairs as SVG numbers with
+    ``SVG_DIGITS`` decimal places, trailing zeros dropped."""
+    return [
+        s.rstrip("0").rstrip(".") if "." in s else s
+        for s in export.decimal_ratios(pairs, SVG_DIGITS)
+    ]
 
 
 def _gradient_color(index: int, total: int) -> Tuple[int, int, int]:
@@ -150,8 +173,77 @@ _DIGITS = {
 }
 
 
+class Raster:
+    """RGB image in one flat ``bytearray``, three bytes per pixel, row-major.
+
+    Rectangles are filled a row at a time with slice assignment, and the
+    image can be written as ASCII (P3) or binary (P6) PPM or as PNG.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        # black background
+        self.data = bytearray(3 * width * height)
+
+    def fill(self, x0: int, y0: int, x1: int, y1: int, color: Tuple[int, int, int]) -> None:
+        """Paint pixels ``x0 <= x < x1``, ``y0 <= y < y1`` (clipped to the image)."""
+        x0 = max(x0, 0)
+        x1 = min(x1, self.width)
+        if x0 >= x1:
+            return
+        run = bytes(color) * (x1 - x0)
+        stride = 3 * self.width
+        data = self.data
+        for y in range(max(y0, 0), min(y1, self.height)):
+            start = y * stride + 3 * x0
+            data[start:start + len(run)] = run
+
+    def rows(self) -> Iterator[bytes]:
+        stride = 3 * self.width
+        data = memoryview(self.data)
+        for start in range(0, len(data), stride):
+            yield data[start:start + stride]
+
+    def write_ppm(self, fh: BinaryIO, binary: bool = True) -> None:
+        """Write a binary P6 or (``binary=False``) ASCII P3 image."""
+        if binary:
+            fh.write(f"P6\n{self.width} {self.height}\n255\n".encode())
+            fh.write(self.data)
+            return
+        fh.write(f"P3\n{self.width} {self.height}\n255\n".encode())
+        for row in self.rows():
+            fh.write(" ".join(map(_DECIMAL_BYTES.__getitem__, row)).encode())
+            fh.write(b"\n")
+
+    def write_png(self, fh: BinaryIO, level: int = 6) -> None:
+        """Write an 8-bit truecolor PNG using only ``zlib``."""
+
+        def chunk(kind: bytes, payload: bytes) -> None:
+            fh.write(struct.pack(">I", len(payload)))
+            fh.write(kind)
+            fh.write(payload)
+            fh.write(struct.pack(">I", zlib.crc32(payload, zlib.crc32(kind))))
+
+        fh.write(b"\x89PNG\r\n\x1a\n")
+        chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+        compressor = zlib.compressobj(level)
+        parts = []
+        for row in self.rows():
+            # filter type 0 (none) for every scanline
+            parts.append(compressor.compress(b"\0"))
+            parts.append(compressor.compress(row))
+        parts.append(compressor.flush())
+        chunk(b"IDAT", b"".join(parts))
+        chunk(b"IEND", b"")
+
+
+# decimal text for each byte value, for P3 output
+_DECIMAL_BYTES = [str(value) for value in range(256)]
+
+
 def _draw_number(
-    pixels: List[List[Tuple[int, int, int]]],
+    raster: Raster,
     text: str,
     x0: int,
     y0: int,
@@ -179,34 +271,28 @@ def _draw_number(
             continue
         offset_x = start_x + index * (char_w * scale + spacing * scale)
         for row, line in enumerate(pattern):
+            py = start_y + row * scale
             for col, c in enumerate(line):
                 if c != "#":
                     continue
-                for dy in range(scale):
-                    for dx in range(scale):
-                        px = offset_x + col * scale + dx
-                        py = start_y + row * scale + dy
-                        if 0 <= py < len(pixels) and 0 <= px < len(pixels[0]):
-                            pixels[py][px] = color
+                px = offset_x + col * scale
+                raster.fill(px, py, px + scale, py + scale, color)
 
-def render_ppm(
+
+def rasterize(
     stack: Stack,
-    filename: str = "stack.ppm",
     scale: int = 400,
     renderer: str = "cycle",
     colors: int = 2,
     numbers: bool = False,
     debug: bool = False,
-) -> None:
-    """Render the stack to a simple PPM image file."""
+) -> Raster:
+    """Paint the stack into a ``Raster`` with ``scale`` pixels per unit."""
     xmax = max(b.x + b.side for b in stack.squares)
     ymax = max(b.y + b.side for b in stack.squares)
     width = int(scale * xmax) + 1
     height = int(scale * ymax) + 1
-    # initialize black background
-    pixels: List[List[Tuple[int, int, int]]] = [
-        [(0, 0, 0) for _ in range(width)] for _ in range(height)
-    ]
+    raster = Raster(width, height)
     total_squares = len(stack.squares)
     color_count = max(1, min(colors, len(COLOR_PALETTE)))
     for square in stack.squares:
@@ -222,16 +308,212 @@ def render_ppm(
         x1 = int(scale * (square.x + square.side))
         y0 = int(scale * (ymax - (square.y + square.side)))
         y1 = int(scale * (ymax - square.y))
-        for y in range(max(y0, 0), min(y1, height)):
-            for x in range(max(x0, 0), min(x1, width)):
-                pixels[y][x] = color
+        raster.fill(x0, y0, x1, y1, color)
         if numbers:
-            _draw_number(pixels, str(square.n), x0, y0, x1, y1, _text_color(color))
-    with open(filename, "w") as fh:
-        fh.write(f"P3\n{width} {height}\n255\n")
-        for row in pixels:
-            fh.write(" ".join(f"{r} {g} {b}" for r, g, b in row))
-            fh.write("\n")
+            _draw_number(raster, str(square.n), x0, y0, x1, y1, _text_color(color))
+    return raster
+
+
+def _spans(lo: float, hi: float, size: int) -> Iterator[Tuple[int, float]]:
+    """Yield ``(pixel, covered length)`` for the interval ``[lo, hi)``."""
+    first = max(int(floor(lo)), 0)
+    last = min(int(ceil(hi)), size)
+    for p in range(first, last):
+        length = min(hi, p + 1) - max(lo, p)
+        if length > 0:
+            yield p, length
+
+
+class _Coverage:
+    """Area-weighted color sums for the partially covered pixels.
+
+    The sums live in a dense ``array('d')`` parallel to ``Raster.data``, and
+    ``seen`` marks the pixels that received any, so ``flush`` only visits
+    those (found with ``bytearray.find``).
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.acc = array("d", [0.0]) * (3 * width * height)
+        self.seen = bytearray(width * height)
+
+    def add(self, pixel: int, w: float, color) -> None:
+        r, g, b = color
+        acc = self.acc
+        i = 3 * pixel
+        acc[i] += w * r
+        acc[i + 1] += w * g
+        acc[i + 2] += w * b
+        self.seen[pixel] = 1
+
+    def flush(self, data: bytearray) -> None:
+        """Round the sums into ``data``."""
+        acc = self.acc
+        seen = self.seen
+        pixel = seen.find(1)
+        while pixel >= 0:
+            i = 3 * pixel
+            # a neighbour's border may touch a pixel some square fully covers
+            for j in range(i, i + 3):
+                data[j] = min(255, int(data[j] + acc[j] + 0.5))
+            pixel = seen.find(1, pixel + 1)
+
+
+def _cover(raster: Raster, coverage: _Coverage, x0, x1, y0, y1, color) -> None:
+    """Paint ``[x0, x1) x [y0, y1)`` (in pixels) with area weights.
+
+    Pixels covered completely are painted into ``raster`` with one slice per
+    row.  The partially covered pixels are weighed one by one into
+    ``coverage``: every pixel of the (at most two)
+    partial rows, and in the full rows only the (at most two) partial
+    columns, so the Python-level work grows with the perimeter rather than
+    the area.  Squares never overlap, so a fully covered pixel holds nothing
+    else.
+    """
+    width = raster.width
+    height = raster.height
+    inner_x0 = max(int(ceil(x0)), 0)
+    inner_x1 = min(int(floor(x1)), width)
+    inner_y0 = max(int(ceil(y0)), 0)
+    inner_y1 = min(int(floor(y1)), height)
+    raster.fill(inner_x0, inner_y0, inner_x1, inner_y1, color)
+    columns = list(_spans(x0, x1, width))
+    # the partial columns, at most one on each side
+    edges = [(x, wx) for x, wx in columns if not inner_x0 <= x < inner_x1]
+    for y, wy in _spans(y0, y1, height):
+        for x, wx in edges if inner_y0 <= y < inner_y1 else columns:
+            coverage.add(y * width + x, wx * wy, color)
+
+
+def _cover_small(coverage: _Coverage, batch: List[float]) -> None:
+    """Accumulate a batch of sub-pixel squares in one pass.
+
+    ``batch`` is flat: ``x0, y0, side, r, g, b`` per square, in pixels.  A
+    square narrower than a pixel touches at most a 2x2 block.
+    """
+    width = coverage.width
+    height = coverage.height
+    for k in range(0, len(batch), 6):
+        x0, y0, side, r, g, b = batch[k:k + 6]
+        x1 = x0 + side
+        y1 = y0 + side
+        cx = int(x0)
+        cy = int(y0)
+        # split the square at the pixel boundaries it crosses
+        xs = ((cx, x0, x1),) if x1 <= cx + 1 else ((cx, x0, cx + 1), (cx + 1, cx + 1, x1))
+        ys = ((cy, y0, y1),) if y1 <= cy + 1 else ((cy, y0, cy + 1), (cy + 1, cy + 1, y1))
+        for py, ya, yb in ys:
+            if not 0 <= py < height:
+                continue
+            for px, xa, xb in xs:
+                if not 0 <= px < width:
+                    continue
+                coverage.add(py * width + px, (xb - xa) * (yb - ya), (r, g, b))
+
+
+def rasterize_coverage(
+    stack: Stack,
+    scale: int = 400,
+    renderer: str = "cycle",
+    colors: int = 2,
+    numbers: bool = False,
+    debug: bool = False,
+    small: float = 1.0,
+) -> Raster:
+    """Paint the stack with exact-area (box filter) antialiasing.
+
+    Every pixel receives the colors of the squares overlapping it weighted by
+    the covered fraction of its area, so squares far below a pixel still add
+    up to the right density instead of vanishing.  Squares whose side is
+    under ``small`` pixels (at most 1) are accumulated in one batch pass;
+    larger ones fill their interior by slices and only weigh their border
+    pixels.  Only partially covered pixels are accumulated, in a dense
+    ``_Coverage``, and rounded into the image at the end.  The image size matches
+    ``rasterize``.
+    """
+    xmax = max(b.x + b.side for b in stack.squares)
+    ymax = max(b.y + b.side for b in stack.squares)
+    width = int(scale * xmax) + 1
+    height = int(scale * ymax) + 1
+    raster = Raster(width, height)
+    coverage = _Coverage(width, height)
+    total_squares = len(stack.squares)
+    color_count = max(1, min(colors, len(COLOR_PALETTE)))
+    small = min(small, 1.0)
+    fscale = float(scale)
+    fymax = float(ymax)
+    batch: List[float] = []
+    labels = []
+    for square in stack.squares:
+        if renderer == "gradient":
+            color = _gradient_color(square.n, total_squares)
+        else:
+            color = _cycle_color(square.n, color_count)
+        if debug:
+            print(
+                f"n={square.n}: ({float(square.x):.3f}, {float(square.y):.3f})"
+            )
+        side = fscale * float(square.side)
+        x0 = fscale * float(square.x)
+        y0 = fscale * (fymax - float(square.y)) - side
+        if side < small:
+            batch.extend((x0, y0, side, *color))
+            if len(batch) >= 6 * 65536:
+                _cover_small(coverage, batch)
+                batch.clear()
+            continue
+        _cover(raster, coverage, x0, x0 + side, y0, y0 + side, color)
+        # a label needs at least 5 pixels per digit row
+        if numbers and side >= 5:
+            labels.append((square, color))
+    _cover_small(coverage, batch)
+    coverage.flush(raster.data)
+    for square, color in labels:
+        x0 = int(scale * square.x)
+        x1 = int(scale * (square.x + square.side))
+        y0 = int(scale * (ymax - (square.y + square.side)))
+        y1 = int(scale * (ymax - square.y))
+        _draw_number(raster, str(square.n), x0, y0, x1, y1, _text_color(color))
+    return raster
+
+
+def render_ppm(
+    stack: Stack,
+    filename: str = "stack.ppm",
+    scale: int = 400,
+    renderer: str = "cycle",
+    colors: int = 2,
+    numbers: bool = False,
+    debug: bool = False,
+    binary: bool = False,
+    coverage: bool = False,
+) -> None:
+    """Render the stack to a PPM image file (ASCII P3, or P6 if ``binary``).
+
+    ``coverage=True`` antialiases with ``rasterize_coverage``.
+    """
+    paint = rasterize_coverage if coverage else rasterize
+    raster = paint(stack, scale, renderer, colors, numbers, debug)
+    with open(filename, "wb") as fh:
+        raster.write_ppm(fh, binary=binary)
+
+
+def render_png(
+    stack: Stack,
+    filename: str = "stack.png",
+    scale: int = 400,
+    renderer: str = "cycle",
+    colors: int = 2,
+    numbers: bool = False,
+    debug: bool = False,
+    coverage: bool = False,
+) -> None:
+    """Render the stack to a PNG image file (see ``render_ppm``)."""
+    paint = rasterize_coverage if coverage else rasterize
+    raster = paint(stack, scale, renderer, colors, numbers, debug)
+    with open(filename, "wb") as fh:
+        raster.write_png(fh)
 
 
 def render_svg(
@@ -241,54 +523,305 @@ def render_svg(
     colors: int = 2,
     numbers: bool = False,
     debug: bool = False,
+    compact: bool = False,
+    compress: bool = False,
+    **compact_options,
 ) -> None:
-    """Render the stack to a simple SVG vector image."""
+    """Render the stack to a simple SVG vector image.
+
+    ``compact`` selects ``write_svg_compact`` (``compact_options`` are its
+    ``pixels`` and ``min_font``); ``compress`` gzips the file (``.svgz``).
+    """
     xmax = max(b.x + b.side for b in stack.squares)
     ymax = max(b.y + b.side for b in stack.squares)
-    total_squares = len(stack.squares)
+    writer = write_svg_compact if compact else write_svg
+    writer(
+        stack.squares,
+        (xmax, ymax),
+        filename=filename,
+        renderer=renderer,
+        colors=colors,
+        numbers=numbers,
+        debug=debug,
+        total=len(stack.squares),
+        compress=compress,
+        **compact_options,
+    )
+
+
+def _open_svg(filename: str, compress: bool, buffering: int) -> TextIO:
+    if compress:
+        return io.TextIOWrapper(
+            gzip.open(filename, "wb", compresslevel=9), encoding="ascii"
+        )
+    return open(filename, "w", buffering=buffering)
+
+
+def write_svg(
+    squares: Iterable,
+    extent: Tuple[Fraction, Fraction],
+    filename: str = "stack.svg",
+    renderer: str = "cycle",
+    colors: int = 2,
+    numbers: bool = False,
+    debug: bool = False,
+    total: Optional[int] = None,
+    buffering: int = 1 << 20,
+    compress: bool = False,
+) -> None:
+    """Stream ``squares`` to an SVG file as they arrive.
+
+    ``extent`` is the ``(xmax, ymax)`` bounding box, declared up front so the
+    header can be written before any square is seen; squares outside it are
+    clipped by the viewer.  Squares are formatted a batch at a time (with
+    ``algorithms.export.decimal_strings``) and nothing is kept across
+    batches, so ``squares`` can be a generator such as
+    ``stack.iter_build(N)``.  The gradient renderer needs
+    ``total``, the number of squares it spreads the gradient over.
+    ``compress`` writes the file gzip-compressed (``.svgz``).
+    """
+    xmax, ymax = extent
+    if renderer == "gradient" and total is None:
+        raise ValueError("the gradient renderer needs the total square count")
     color_count = max(1, min(colors, len(COLOR_PALETTE)))
-    with open(filename, "w") as fh:
+    it = iter(squares)
+    with _open_svg(filename, compress, buffering) as fh:
+        width, height = _svg_numbers(
+            [(xmax.numerator, xmax.denominator), (ymax.numerator, ymax.denominator)]
+        )
         fh.write(
-            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {_fmt(xmax)} {_fmt(ymax)}">\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}">\n'
         )
         fh.write('<rect width="100%" height="100%" fill="black" />\n')
-        for square in stack.squares:
-            if renderer == "gradient":
-                color = _gradient_color(square.n, total_squares)
-            else:
-                color = _cycle_color(square.n, color_count)
-            if debug:
-                print(
-                    f"n={square.n}: ({float(square.x):.3f}, {float(square.y):.3f})"
-                )
-            fh.write(
-                f'<rect x="{_fmt(square.x)}" y="{_fmt(ymax - (square.y + square.side))}" '
-                f'width="{_fmt(square.side)}" height="{_fmt(square.side)}" '
-                f'fill="rgb({color[0]},{color[1]},{color[2]})" />\n'
+        top, scale = ymax.numerator, ymax.denominator
+        while True:
+            batch = list(islice(it, 4096))
+            if not batch:
+                break
+            # square n has side 1/n; the coordinates are kept as unreduced
+            # integer ratios, which is all the decimal rounding needs
+            rows = [
+                (b.n, b.x.numerator, b.x.denominator, b.y.numerator, b.y.denominator)
+                for b in batch
+            ]
+            xs = _svg_numbers([(a, b) for _, a, b, _, _ in rows])
+            ys = _svg_numbers(
+                [
+                    (top * d * n - c * scale * n - scale * d, scale * d * n)
+                    for n, _, _, c, d in rows
+                ]
             )
+            sides = _svg_numbers([(1, n) for n, _, _, _, _ in rows])
             if numbers:
-                text_color = _text_color(color)
-                digits = len(str(square.n))
-                max_size = square.side * Fraction(8, 10)
-                width_based = square.side * Fraction(8, 10) / (Fraction(6, 10) * digits)
-                font_size = min(max_size, width_based)
+                cxs = _svg_numbers([(2 * a * n + b, 2 * b * n) for n, a, b, _, _ in rows])
+                cys = _svg_numbers(
+                    [
+                        (2 * top * d * n - 2 * c * scale * n - scale * d, 2 * scale * d * n)
+                        for n, _, _, c, d in rows
+                    ]
+                )
+                # 0.8 of the side, or less so that the digits fit across it
+                fonts = _svg_numbers(
+                    [
+                        (4, 5 * n) if n < 10 else (4, 3 * len(str(n)) * n)
+                        for n, _, _, _, _ in rows
+                    ]
+                )
+            for k, square in enumerate(batch):
+                if renderer == "gradient":
+                    color = _gradient_color(square.n, total)
+                else:
+                    color = _cycle_color(square.n, color_count)
+                if debug:
+                    print(
+                        f"n={square.n}: ({float(square.x):.3f}, {float(square.y):.3f})"
+                    )
                 fh.write(
-                    f'<text x="{_fmt(square.x + square.side / 2)}" '
-                    f'y="{_fmt(ymax - (square.y + square.side / 2))}" '
-                    f'font-size="{_fmt(font_size)}" '
-                    f'text-anchor="middle" dominant-baseline="central" '
-                    f'fill="rgb({text_color[0]},{text_color[1]},{text_color[2]})">'
-                    f'{square.n}</text>\n'
+                    f'<rect x="{xs[k]}" y="{ys[k]}" '
+                    f'width="{sides[k]}" height="{sides[k]}" '
+                    f'fill="rgb({color[0]},{color[1]},{color[2]})" />\n'
                 )
+                if numbers:
+                    text_color = _text_color(color)
+                    fh.write(
+                        f'<text x="{cxs[k]}" '
+                        f'y="{cys[k]}" '
+                        f'font-size="{fonts[k]}" '
+                        f'text-anchor="middle" dominant-baseline="central" '
+                        f'fill="rgb({text_color[0]},{text_color[1]},{text_color[2]})">'
+                        f'{square.n}</text>\n'
+                    )
         fh.write("</svg>\n")
 
 
+# ``write_svg_compact`` coordinates are integers on a grid of ``pixels``
+# units across the larger side of the image
+SVG_PIXELS = 1 << 14
+
+
+def write_svg_compact(
+    squares: Iterable,
+    extent: Tuple[Fraction, Fraction],
+    filename: str = "stack.svg",
+    renderer: str = "cycle",
+    colors: int = 2,
+    numbers: bool = False,
+    debug: bool = False,
+    total: Optional[int] = None,
+    buffering: int = 1 << 20,
+    compress: bool = False,
+    pixels: int = SVG_PIXELS,
+    min_font: float = 8,
+) -> None:
+    """Write ``squares`` as a small SVG file.
+
+    The viewBox is ``pixels`` units across the larger side of ``extent``,
+    which is as fine as the image can be shown without rasterizing below a
+    unit, and square edges are snapped to that integer grid.  Adjacent
+    squares therefore share their edges exactly, and squares whose snapped
+    size is zero are left out.  All squares of one color form a single
+    ``<path>`` of relative moves, and labels whose font would be smaller than
+    ``min_font`` units are dropped.  The paths are collected in memory per
+    color, so unlike ``write_svg`` this keeps a few bytes per square.
+    """
+    xmax, ymax = extent
+    if renderer == "gradient" and total is None:
+        raise ValueError("the gradient renderer needs the total square count")
+    color_count = max(1, min(colors, len(COLOR_PALETTE)))
+    scale = pixels / float(max(xmax, ymax))
+    height = float(ymax)
+    width_units = ceil(float(xmax) * scale)
+    height_units = ceil(height * scale)
+    # color -> path pieces and the start of the previous subpath
+    paths = {}
+    labels = {(0, 0, 0): [], (255, 255, 255): []}
+    for square in squares:
+        if renderer == "gradient":
+            color = _gradient_color(square.n, total)
+        else:
+            color = _cycle_color(square.n, color_count)
+        if debug:
+            print(f"n={square.n}: ({float(square.x):.3f}, {float(square.y):.3f})")
+        x = float(square.x)
+        y = float(square.y)
+        side = 1 / square.n
+        left = floor(x * scale + 0.5)
+        right = floor((x + side) * scale + 0.5)
+        top = floor((height - y - side) * scale + 0.5)
+        bottom = floor((height - y) * scale + 0.5)
+        w = right - left
+        h = bottom - top
+        if w <= 0 or h <= 0:
+            continue
+        entry = paths.get(color)
+        if entry is None:
+            entry = paths[color] = [[], 0, 0]
+        pieces, px, py = entry
+        pieces.append(f"m{left - px} {top - py}h{w}v{h}h{-w}z")
+        entry[1] = left
+        entry[2] = top
+        if numbers:
+            digits = len(str(square.n))
+            font = min(w, h) * 0.8 / max(1.0, 0.6 * digits)
+            if font >= min_font:
+                labels[_text_color(color)].append(
+                    f'<text x="{left + w // 2}" y="{top + h // 2}" '
+                    f'font-size="{font:.0f}">{square.n}</text>\n'
+                )
+    with _open_svg(filename, compress, buffering) as fh:
+        fh.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" '
+            f'viewBox="0 0 {width_units} {height_units}">\n'
+        )
+        fh.write('<rect width="100%" height="100%" fill="black" />\n')
+        for (r, g, b), (pieces, _, _) in paths.items():
+            # a leading relative moveto is absolute, from the origin
+            fh.write(f'<path fill="rgb({r},{g},{b})" d="')
+            fh.writelines(pieces)
+            fh.write('" />\n')
+        for (r, g, b), texts in labels.items():
+            if not texts:
+                continue
+            fh.write(
+                f'<g text-anchor="middle" dominant-baseline="central" '
+                f'fill="rgb({r},{g},{b})">\n'
+            )
+            fh.writelines(texts)
+            fh.write("</g>\n")
+        fh.write("</svg>\n")
+
+
+def stream_squares(stack, count: int) -> Iterator:
+    """Yield squares ``1..count`` without keeping them all in memory.
+
+    Stacks with random access (erdos, rational) are read lazily square by
+    square.  The others are extended with ``iter_build`` after their store
+    is switched to ``keep_last``; their placement state (skyline, corners
+    or right edges) still grows with the squares placed.
+    """
+    if hasattr(stack, "iter_range"):
+        return stack.iter_range(1, count + 1)
+    head = stack.squares[:count]
+    stack.squares.keep_last()
+    return chain(head, stack.iter_build(count))
+
+
+def stream_extent(stack) -> Optional[Tuple[Fraction, Fraction]]:
+    """Bounding box known before building, or ``None`` if there is none."""
+    module = importlib.import_module(type(stack).__module__)
+    return getattr(module, "EXTENT", None)
+
+
+def render(
+    stack: Stack,
+    image_format: str,
+    filename: str,
+    scale: int = 400,
+    coverage: bool = False,
+    **options,
+) -> None:
+    """Write ``stack`` as ``svg``, ``svgz``, ``ppm``, ``p6`` or ``png`` (see
+    ``--format``).
+
+    ``options`` are passed on to the renderer (``renderer``, ``colors``,
+    ``numbers``, ``debug``, and for SVG ``compact``, ``pixels`` and
+    ``min_font``); ``scale`` and ``coverage`` only apply to bitmaps.
+    ``svgz`` is a gzip-compressed compact SVG.
+    """
+    if image_format in ("ppm", "p6"):
+        render_ppm(
+            stack,
+            filename=filename,
+            scale=scale,
+            binary=image_format == "p6",
+            coverage=coverage,
+            **options,
+        )
+    elif image_format == "png":
+        render_png(stack, filename=filename, scale=scale, coverage=coverage, **options)
+    elif image_format == "svg":
+        render_svg(stack, filename=filename, **options)
+    elif image_format == "svgz":
+        options.setdefault("compact", True)
+        render_svg(stack, filename=filename, compress=True, **options)
+    else:
+        raise ValueError(f"unknown image format {image_format!r}")
+
+
+# default file extension per ``--format``
+_EXTENSIONS = {"svg": "svg", "svgz": "svgz", "ppm": "ppm", "p6": "ppm", "png": "png", "tiles": "tiles"}
+
+
 def main() -> None:
     import argparse
 
     parser = argparse.ArgumentParser(description="Render square stacks")
     parser.add_argument(
-        "N", type=int, nargs="?", default=100, help="number of squares to render"
+        "N",
+        type=int,
+        nargs="?",
+        default=None,
+        help="number of squares to render (default: 100, or all squares in --load)",
     )
     parser.add_argument(
         "--algo",
@@ -325,48 +858,194 @@ def main() -> None:
     parser.add_argument(
         "--binary",
         action="store_true",
-        help="write a PPM bitmap image instead of an SVG file",
+        help="write a PPM bitmap image instead of an SVG file (same as --format ppm)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(_EXTENSIONS),
+        help="output format: svg, gzipped compact svgz, ASCII ppm, binary p6, png "
+        "or a tiles directory (default: svg)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="write SVG on an integer grid with one path per color and only "
+        "legible labels",
+    )
+    parser.add_argument(
+        "--svg-pixels",
+        type=int,
+        default=SVG_PIXELS,
+        help=f"grid units across a compact SVG (default: {SVG_PIXELS})",
+    )
+    parser.add_argument(
+        "--min-font",
+        type=float,
+        default=8,
+        help="smallest label kept in a compact SVG, in grid units (default: 8)",
+    )
+    parser.add_argument(
+        "--levels",
+        type=int,
+        default=6,
+        help="zoom levels for --format tiles (default: 6)",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=256,
+        help="tile width and height in pixels (default: 256)",
+    )
+    parser.add_argument(
+        "--region",
+        nargs=4,
+        type=Fraction,
+        metavar=("X0", "Y0", "X1", "Y1"),
+        help="only write tiles intersecting this box from level 3 on",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="processes rendering tiles (default: one per CPU)",
     )
     parser.add_argument(
         "--debug",
         action="store_true",
         help="print square details as they are rendered",
     )
+    parser.add_argument(
+        "--coverage",
+        action="store_true",
+        help="antialias bitmaps by exact covered area per pixel",
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=400,
+        help="pixels per unit length for bitmap formats (default: 400)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="write the SVG while squares are produced, without keeping "
+        "them (the sylvester stacks still keep their placement state)",
+    )
+    parser.add_argument(
+        "--extent",
+        nargs=2,
+        type=Fraction,
+        metavar=("WIDTH", "HEIGHT"),
+        help="bounding box for --stream (needed for the sylvester stacks)",
+    )
+    parser.add_argument(
+        "--load",
+        metavar="FILE",
+        help="render a stack saved with Stack.save instead of building one",
+    )
+    parser.add_argument(
+        "--save", metavar="FILE", help="also save the built stack to FILE"
+    )
+    stats.add_arguments(parser)
     parser.add_argument("--output", help="output file name")
     args = parser.parse_args()
+    profile = stats.requested(args)
+    if args.format is None:
+        args.format = "ppm" if args.binary else "svg"
+    elif args.binary and args.format != "ppm":
+        parser.error("--binary conflicts with --format " + args.format)
 
-    if args.algo == "sylvester":
-        if args.fill_cover_seams:
-            stack = load_stack(
-                "sylvester_with_seams", strict=False, open_bounds=False
-            )
+    vector = args.format in ("svg", "svgz")
+    if args.stream and (not vector or args.load is not None or args.save is not None):
+        parser.error("--stream only writes SVG and cannot be combined with --load/--save")
+    if args.compact and not vector:
+        parser.error("--compact only applies to SVG")
+    svg_options = {}
+    if args.compact or args.format == "svgz":
+        svg_options = {"compact": True, "pixels": args.svg_pixels, "min_font": args.min_font}
+
+    if args.load is not None:
+        saved = persist.SavedStack(args.load, args.N)
+        if args.N is not None and args.N > len(saved.squares):
+            # the saved stack is too small: resume building from it
+            saved.close()
+            stack = persist.load(args.load)
+            if profile:
+                stack.profile()
+            stack.build(args.N)
         else:
-            stack = load_stack(
-                "sylvester", strict=True, open_bounds=not args.fill
-            )
+            if profile:
+                parser.error("--profile needs a build; this --load only reads squares")
+            stack = saved
     else:
-        stack = load_stack(args.algo, strict=True, open_bounds=False)
-    stack.build(args.N)
-    if args.output is None:
-        args.output = "stack.ppm" if args.binary else "stack.svg"
-    if args.binary:
-        render_ppm(
-            stack,
-            filename=args.output,
+        stack = make_stack(args.algo, args.fill, args.fill_cover_seams)
+        if profile:
+            stack.profile()
+
+    if args.stream:
+        if profile and hasattr(stack, "iter_range"):
+            parser.error(f"--profile needs a build; --stream reads {args.algo} squares directly")
+        count = 100 if args.N is None else args.N
+        extent = args.extent
+        if extent is None:
+            extent = stream_extent(stack)
+        if extent is None:
+            parser.error(f"--stream with --algo {args.algo} needs --extent WIDTH HEIGHT")
+        writer = write_svg
+        if svg_options.pop("compact", False):
+            writer = write_svg_compact
+        writer(
+            stream_squares(stack, count),
+            tuple(extent),
+            filename=args.output or "stack." + _EXTENSIONS[args.format],
             renderer=args.coloring,
             colors=args.colors,
             numbers=not args.no_numbers,
             debug=args.debug,
+            total=count,
+            compress=args.format == "svgz",
+            **svg_options,
         )
-    else:
-        render_svg(
+        stats.emit(getattr(stack, "stats", None), args.profile_json)
+        return
+
+    if args.load is None:
+        stack.build(100 if args.N is None else args.N)
+    stats.emit(getattr(stack, "stats", None), args.profile_json)
+    if args.save is not None:
+        if isinstance(stack, persist.SavedStack):
+            parser.error("--save needs a stack that was built, not just loaded")
+        stack.save(args.save)
+    if args.output is None:
+        args.output = "stack." + _EXTENSIONS[args.format]
+    if args.format == "tiles":
+        from tools.tiles import render_tiles
+
+        count = render_tiles(
             stack,
-            filename=args.output,
+            directory=args.output,
+            levels=args.levels,
+            tile_size=args.tile_size,
             renderer=args.coloring,
             colors=args.colors,
-            numbers=not args.no_numbers,
-            debug=args.debug,
+            region=args.region,
+            workers=args.workers,
         )
+        print(f"wrote {count} tiles to {args.output}")
+        return
+    if vector and args.coverage:
+        parser.error("--coverage only applies to bitmap formats")
+    render(
+        stack,
+        args.format,
+        args.output,
+        scale=args.scale,
+        coverage=args.coverage,
+        renderer=args.coloring,
+        colors=args.colors,
+        numbers=not args.no_numbers,
+        debug=args.debug,
+        **svg_options,
+    )
 
 
 if __name__ == "__main__":
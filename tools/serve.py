@@ -0,0 +1,496 @@
+from __future__ import annotations
+import asyncio
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from tools.render_stack import COLOR_PALETTE, Raster, _cycle_color, make_stack, stream_extent
+
+# Interactive zoom and pan (docs/todo.md item 7).  A local asyncio HTTP server
+# keeps one live ``Stack`` per variant and serves PNG tiles of it in an XYZ
+# layout like ``tools/tiles.py``: level ``z`` shows ``tile_size * 2**z``
+# pixels across the larger side of the stack's fixed frame.  Only squares at
+# least ``min_pixels`` wide are drawn on a level, so a level needs the squares
+# up to ``n = pixels per unit / min_pixels``.  When a tile asks for more, the
+# stack is extended in the background a chunk at a time and the tile is served
+# right away from the squares placed so far; the page polls ``/status`` and
+# reloads its tiles as the count grows.
+#
+# Rendered tiles are kept in an LRU cache.  After each chunk only the cached
+# tiles that one of the new squares is drawn on are dropped, so the shallow
+# levels stay cached while a deep zoom is being filled in.
+#
+#   GET /                          the viewer page (no external resources)
+#   GET /stacks                    names, frames and level limits as JSON
+#   GET /status/NAME               squares placed and the build target
+#   GET /tiles/NAME/Z/X/Y.png      one tile
+#
+# The server only listens on 127.0.0.1.
+
+# name -> ``make_stack`` arguments
+STACKS = {
+    "rational": {"algo": "rational"},
+    "erdos": {"algo": "erdos"},
+    "sylvester": {"algo": "sylvester"},
+    "sylvester-fill": {"algo": "sylvester", "fill": True},
+    "sylvester-fill-cover-seams": {"algo": "sylvester", "fill_cover_seams": True},
+}
+# The Sylvester stacks have height 1 but widen without bound (slowly: about 4
+# units after 4000 squares), so their frame is fixed up front
+SYLVESTER_FRAME = (Fraction(8), Fraction(1))
+
+
+class TileCache:
+    """LRU cache of PNG tiles keyed by ``(name, z, x, y)``."""
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self._tiles: "OrderedDict[Tuple[str, int, int, int], bytes]" = OrderedDict()
+
+    def get(self, key) -> Optional[bytes]:
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile: bytes) -> None:
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.capacity:
+            self._tiles.popitem(last=False)
+
+    def levels(self, name: str) -> List[int]:
+        return sorted({z for stack, z, _, _ in self._tiles if stack == name})
+
+    def discard(self, key) -> None:
+        self._tiles.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+
+class LiveStack:
+    """A stack being extended on demand, with the tile geometry of its frame.
+
+    ``lock`` guards the stack: the builder holds it for one chunk at a time
+    and tile rendering holds it while collecting the squares of a tile.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tile_size: int = 256,
+        colors: int = 2,
+        min_pixels: int = 1,
+        max_squares: int = 1 << 20,
+        chunk: int = 256,
+    ) -> None:
+        self.name = name
+        self.stack = make_stack(**STACKS[name])
+        frame = stream_extent(self.stack)
+        self.frame: Tuple[Fraction, Fraction] = tuple(frame) if frame else SYLVESTER_FRAME
+        self.tile_size = tile_size
+        self.color_count = max(1, min(colors, len(COLOR_PALETTE)))
+        self.min_pixels = min_pixels
+        self.max_squares = max_squares
+        self.chunk = chunk
+        self.lock = threading.Lock()
+        self.count = len(self.stack.squares)
+        self.target = self.count
+        self._builder: Optional[asyncio.Task] = None
+
+    def scale(self, z: int) -> Fraction:
+        """Pixels per unit on level ``z``."""
+        return Fraction(self.tile_size * 2 ** z) / max(self.frame)
+
+    def tiles(self, z: int) -> Tuple[int, int]:
+        """Number of tile columns and rows on level ``z``."""
+        scale = self.scale(z)
+        width, height = self.frame
+        return (
+            -int(-(scale * width) // self.tile_size),
+            -int(-(scale * height) // self.tile_size),
+        )
+
+    def needed(self, z: int) -> int:
+        """Squares level ``z`` draws (every one at least ``min_pixels`` wide)."""
+        return min(self.max_squares, int(self.scale(z) / self.min_pixels))
+
+    def render(self, z: int, tx: int, ty: int) -> Tuple[bytes, int]:
+        """PNG of tile ``(z, tx, ty)`` and the square count it was drawn from.
+
+        Runs on an executor thread; the lock is only held while the squares
+        are looked up.
+        """
+        size = self.tile_size
+        scale = self.scale(z)
+        height = self.frame[1]
+        x0 = Fraction(tx * size) / scale
+        x1 = Fraction((tx + 1) * size) / scale
+        y1 = height - Fraction(ty * size) / scale
+        y0 = height - Fraction((ty + 1) * size) / scale
+        with self.lock:
+            count = len(self.stack.squares)
+            squares = self.stack.squares.query_rect(x0, y0, x1, y1, max_n=self.needed(z))
+        raster = Raster(size, size)
+        ox = tx * size
+        oy = ty * size
+        for square in squares:
+            raster.fill(
+                int(scale * square.x) - ox,
+                int(scale * (height - (square.y + square.side))) - oy,
+                int(scale * (square.x + square.side)) - ox,
+                int(scale * (height - square.y)) - oy,
+                _cycle_color(square.n, self.color_count),
+            )
+        out = io.BytesIO()
+        raster.write_png(out)
+        return out.getvalue(), count
+
+    def _extend(self, count: int) -> List[Tuple[int, float, float]]:
+        """Build up to ``count`` squares; returns the new ``(n, x, y)``."""
+        with self.lock:
+            squares = self.stack.squares
+            start = len(squares)
+            self.stack.build(count)
+            return [
+                (squares.n[i], float(squares.x[i]), float(squares.y[i]))
+                for i in range(start, len(squares))
+            ]
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "squares": self.count,
+            "target": self.target,
+            "building": self._builder is not None,
+        }
+
+
+class TileServer:
+    def __init__(
+        self,
+        names: List[str],
+        tile_size: int = 256,
+        colors: int = 2,
+        max_level: int = 14,
+        max_squares: int = 1 << 20,
+        cache_size: int = 4096,
+        chunk: int = 256,
+        workers: int = 4,
+    ) -> None:
+        self.names = names
+        self.tile_size = tile_size
+        self.colors = colors
+        self.max_level = max_level
+        self.max_squares = max_squares
+        self.chunk = chunk
+        self.cache = TileCache(cache_size)
+        self.stacks: Dict[str, LiveStack] = {}
+        self._render_pool = ThreadPoolExecutor(max_workers=workers)
+        # one builder thread, so a long build never takes a rendering thread
+        self._build_pool = ThreadPoolExecutor(max_workers=1)
+
+    def live(self, name: str) -> LiveStack:
+        live = self.stacks.get(name)
+        if live is None:
+            live = self.stacks[name] = LiveStack(
+                name,
+                self.tile_size,
+                self.colors,
+                max_squares=self.max_squares,
+                chunk=self.chunk,
+            )
+        return live
+
+    def request_build(self, live: LiveStack, count: int) -> None:
+        if count <= live.target:
+            return
+        live.target = count
+        if live._builder is None:
+            live._builder = asyncio.get_running_loop().create_task(self._build(live))
+
+    async def _build(self, live: LiveStack) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while live.count < live.target:
+                end = min(live.target, live.count + live.chunk)
+                placed = await loop.run_in_executor(self._build_pool, live._extend, end)
+                self._invalidate(live, placed)
+                live.count = len(live.stack.squares)
+                if not placed:
+                    break
+        finally:
+            live._builder = None
+
+    def _invalidate(self, live: LiveStack, placed: List[Tuple[int, float, float]]) -> None:
+        """Drop the cached tiles of ``live`` that any of ``placed`` is drawn on."""
+        size = live.tile_size
+        height = float(live.frame[1])
+        for z in self.cache.levels(live.name):
+            scale = float(live.scale(z))
+            visible = live.needed(z)
+            for n, x, y in placed:
+                if n > visible:
+                    continue
+                side = 1.0 / n
+                for tx in range(int(scale * x) // size, int(scale * (x + side)) // size + 1):
+                    top = int(scale * (height - y - side)) // size
+                    bottom = int(scale * (height - y)) // size
+                    for ty in range(top, bottom + 1):
+                        self.cache.discard((live.name, z, tx, ty))
+
+    async def tile(self, name: str, z: int, tx: int, ty: int) -> Optional[bytes]:
+        if name not in self.names or not 0 <= z <= self.max_level:
+            return None
+        live = self.live(name)
+        columns, rows = live.tiles(z)
+        if not (0 <= tx < columns and 0 <= ty < rows):
+            return None
+        self.request_build(live, live.needed(z))
+        key = (name, z, tx, ty)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        png, count = await loop.run_in_executor(self._render_pool, live.render, z, tx, ty)
+        # cache only tiles drawn from squares whose invalidations have all been
+        # applied; a chunk finishing meanwhile could have touched this tile
+        if count == live.count:
+            self.cache.put(key, png)
+        return png
+
+    def stacks_info(self) -> dict:
+        info = {}
+        for name in self.names:
+            live = self.live(name)
+            info[name] = {
+                "frame": [float(v) for v in live.frame],
+                "tile_size": self.tile_size,
+                "max_level": self.max_level,
+            }
+        return info
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # skip the headers; requests have no body
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                parts = line.decode("latin-1").split()
+                if len(parts) < 2 or parts[0] != "GET":
+                    await self._respond(writer, 405, "text/plain", b"only GET\n")
+                    continue
+                status, kind, body, headers = await self._route(urlsplit(parts[1]).path)
+                await self._respond(writer, status, kind, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, path: str):
+        if path in ("/", "/index.html"):
+            return 200, "text/html; charset=utf-8", VIEWER.encode("utf-8"), {}
+        if path == "/stacks":
+            return 200, "application/json", json.dumps(self.stacks_info()).encode(), {}
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "status" and parts[1] in self.names:
+            body = json.dumps(self.live(parts[1]).status()).encode()
+            return 200, "application/json", body, {}
+        if len(parts) == 5 and parts[0] == "tiles" and parts[4].endswith(".png"):
+            try:
+                z, tx, ty = int(parts[2]), int(parts[3]), int(parts[4][:-4])
+            except ValueError:
+                z = -1
+            if z >= 0:
+                png = await self.tile(parts[1], z, tx, ty)
+                if png is not None:
+                    squares = str(self.stacks[parts[1]].count)
+                    return 200, "image/png", png, {"X-Squares": squares}
+        return 404, "text/plain", b"not found\n", {}
+
+    @staticmethod
+    async def _respond(writer, status: int, kind: str, body: bytes, headers=None) -> None:
+        reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        lines = [
+            f"HTTP/1.1 {status} {reason}",
+            f"Content-Type: {kind}",
+            f"Content-Length: {len(body)}",
+            "Cache-Control: no-cache",
+        ]
+        lines.extend(f"{key}: {value}" for key, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, port: int = 8000) -> None:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", port)
+        print(f"serving {', '.join(self.names)} on http://127.0.0.1:{port}/")
+        async with server:
+            await server.serve_forever()
+
+
+VIEWER = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Basel stacks</title>
+<style>
+html, body { margin: 0; height: 100%; background: #000; overflow: hidden; }
+canvas { display: block; }
+#bar { position: fixed; top: 8px; left: 8px; color: #ddd; font: 13px sans-serif;
+       background: rgba(0, 0, 0, 0.6); padding: 4px 8px; }
+</style></head>
+<body><canvas id="view"></canvas>
+<div id="bar"><select id="stack"></select> <span id="info"></span></div>
+<script>
+const canvas = document.getElementById("view");
+const ctx = canvas.getContext("2d");
+const select = document.getElementById("stack");
+const info = document.getElementById("info");
+let stacks = {}, name = null, view = null, squares = 0;
+const images = new Map();
+
+function fit() {
+  const s = stacks[name], w = canvas.width, h = canvas.height;
+  const ppu = 0.9 * Math.min(w / s.frame[0], h / s.frame[1]);
+  // screen = (unit - origin) * ppu, with y measured down from the frame top
+  view = {ppu: ppu, ox: (s.frame[0] - w / ppu) / 2, oy: (s.frame[1] - h / ppu) / 2};
+}
+
+function draw() {
+  const s = stacks[name], size = s.tile_size, big = Math.max(s.frame[0], s.frame[1]);
+  ctx.fillStyle = "#000";
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  let z = Math.ceil(Math.log2(view.ppu * big / size));
+  z = Math.max(0, Math.min(s.max_level, z));
+  const ppu = size * 2 ** z / big, k = view.ppu / ppu;
+  const columns = Math.ceil(s.frame[0] * ppu / size), rows = Math.ceil(s.frame[1] * ppu / size);
+  const x0 = Math.max(0, Math.floor(view.ox * ppu / size));
+  const y0 = Math.max(0, Math.floor(view.oy * ppu / size));
+  const x1 = Math.min(columns - 1, Math.floor((view.ox + canvas.width / view.ppu) * ppu / size));
+  const y1 = Math.min(rows - 1, Math.floor((view.oy + canvas.height / view.ppu) * ppu / size));
+  for (let tx = x0; tx <= x1; tx++) {
+    for (let ty = y0; ty <= y1; ty++) {
+      const url = `/tiles/${name}/${z}/${tx}/${ty}.png?v=${squares}`;
+      let img = images.get(url);
+      if (!img) {
+        img = new Image();
+        img.onload = draw;
+        img.src = url;
+        images.set(url, img);
+        if (images.size > 2048) images.delete(images.keys().next().value);
+      }
+      if (img.complete && img.naturalWidth) {
+        const sx = (tx * size - view.ox * ppu) * k, sy = (ty * size - view.oy * ppu) * k;
+        ctx.drawImage(img, sx, sy, size * k + 0.5, size * k + 0.5);
+      }
+    }
+  }
+  info.textContent = `level ${z}, ${squares} squares`;
+}
+
+function resize() {
+  canvas.width = window.innerWidth;
+  canvas.height = window.innerHeight;
+  if (view) draw();
+}
+
+async function poll() {
+  if (name) {
+    const status = await (await fetch(`/status/${name}`)).json();
+    if (status.squares !== squares) { squares = status.squares; draw(); }
+  }
+  setTimeout(poll, 1000);
+}
+
+let drag = null;
+canvas.addEventListener("mousedown", e => { drag = {x: e.clientX, y: e.clientY}; });
+window.addEventListener("mouseup", () => { drag = null; });
+window.addEventListener("mousemove", e => {
+  if (!drag) return;
+  view.ox -= (e.clientX - drag.x) / view.ppu;
+  view.oy -= (e.clientY - drag.y) / view.ppu;
+  drag = {x: e.clientX, y: e.clientY};
+  draw();
+});
+canvas.addEventListener("wheel", e => {
+  e.preventDefault();
+  const factor = Math.exp(-e.deltaY * 0.002);
+  const ux = view.ox + e.clientX / view.ppu, uy = view.oy + e.clientY / view.ppu;
+  view.ppu *= factor;
+  view.ox = ux - e.clientX / view.ppu;
+  view.oy = uy - e.clientY / view.ppu;
+  draw();
+}, {passive: false});
+select.addEventListener("change", () => { name = select.value; squares = 0; fit(); draw(); });
+window.addEventListener("resize", resize);
+
+fetch("/stacks").then(r => r.json()).then(data => {
+  stacks = data;
+  for (const key of Object.keys(stacks)) select.add(new Option(key, key));
+  name = select.value;
+  resize();
+  fit();
+  draw();
+  poll();
+});
+</script></body></html>
+"""
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve live square stacks for zooming and panning on localhost"
+    )
+    parser.add_argument("--port", type=int, default=8000, help="port on 127.0.0.1 (default: 8000)")
+    parser.add_argument(
+        "--stacks",
+        nargs="+",
+        choices=sorted(STACKS),
+        default=["rational", "erdos", "sylvester"],
+        help="stacks to offer",
+    )
+    parser.add_argument("--tile-size", type=int, default=256, help="tile size in pixels")
+    parser.add_argument("--colors", type=int, default=2, help="number of colors to cycle through")
+    parser.add_argument("--max-level", type=int, default=14, help="deepest zoom level")
+    parser.add_argument(
+        "--max-squares",
+        type=int,
+        default=1 << 20,
+        help="never build a stack beyond this many squares",
+    )
+    parser.add_argument("--cache", type=int, default=4096, help="tiles kept in memory")
+    parser.add_argument(
+        "--chunk",
+        type=int,
+        default=256,
+        help="squares placed per build step (tiles wait at most one step)",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="tile rendering threads")
+    args = parser.parse_args()
+
+    server = TileServer(
+        args.stacks,
+        tile_size=args.tile_size,
+        colors=args.colors,
+        max_level=args.max_level,
+        max_squares=args.max_squares,
+        cache_size=args.cache,
+        chunk=args.chunk,
+        workers=args.workers,
+    )
+    try:
+        asyncio.run(server.serve(args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+from tools.render_stack import (
+    COLOR_PALETTE,
+    Raster,
+    _cycle_color,
+    _gradient_color,
+)
+
+# Deep-zoom export.  Level ``z`` of the pyramid shows the stack at
+# ``tile_size * 2**z`` pixels per ``extent`` (the larger side of the bounding
+# box), cut into ``tile_size`` square PNG tiles stored XYZ-style as
+# ``DIR/z/x/y.png`` with ``y`` counted from the top.  A square is drawn on a
+# level only once it is at least ``min_pixels`` wide there, tiles no square
+# touches are not written, and ``region`` limits the deeper levels to a
+# window so a deep zoom does not render the whole image at full resolution.
+
+Box = Tuple[int, int, int, int, int, int, int]  # x0, y0, x1, y1, r, g, b
+
+
+def _render_tile(job: Tuple[str, int, List[Box]]) -> str:
+    path, tile_size, boxes = job
+    raster = Raster(tile_size, tile_size)
+    for x0, y0, x1, y1, r, g, b in boxes:
+        raster.fill(x0, y0, x1, y1, (r, g, b))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        raster.write_png(fh)
+    return path
+
+
+def render_tiles(
+    stack,
+    directory: str = "tiles",
+    levels: int = 6,
+    tile_size: int = 256,
+    renderer: str = "cycle",
+    colors: int = 2,
+    region: Optional[Tuple[Fraction, Fraction, Fraction, Fraction]] = None,
+    region_level: int = 3,
+    min_pixels: int = 1,
+    workers: Optional[int] = None,
+) -> int:
+    """Write a tile pyramid of ``stack`` under ``directory``.
+
+    ``region`` is ``(x0, y0, x1, y1)`` in stack coordinates; levels from
+    ``region_level`` on only produce the tiles that intersect it.  Tiles are
+    rendered on a process pool of ``workers`` processes.  Returns the number
+    of tiles written; a ``tiles.json`` next to them describes the layout.
+    """
+    squares = stack.squares
+    xmax = max(b.x + b.side for b in squares)
+    ymax = max(b.y + b.side for b in squares)
+    extent = max(xmax, ymax)
+    total_squares = len(squares)
+    color_count = max(1, min(colors, len(COLOR_PALETTE)))
+
+    # tile ranges per level: (tx0, ty0, tx1, ty1), end-exclusive
+    limits = []
+    for z in range(levels):
+        scale = tile_size * 2 ** z / extent
+        tx1 = int(scale * xmax) // tile_size + 1
+        ty1 = int(scale * ymax) // tile_size + 1
+        bounds = (0, 0, tx1, ty1)
+        if region is not None and z >= region_level:
+            rx0, ry0, rx1, ry1 = region
+            bounds = (
+                max(0, int(scale * rx0) // tile_size),
+                max(0, int(scale * (ymax - ry1)) // tile_size),
+                min(tx1, int(scale * rx1) // tile_size + 1),
+                min(ty1, int(scale * (ymax - ry0)) // tile_size + 1),
+            )
+        limits.append((scale, bounds))
+
+    buckets: Dict[Tuple[int, int, int], List[Box]] = {}
+    for square in squares:
+        if renderer == "gradient":
+            color = _gradient_color(square.n, total_squares)
+        else:
+            color = _cycle_color(square.n, color_count)
+        for z, (scale, (bx0, by0, bx1, by1)) in enumerate(limits):
+            if scale * square.side < min_pixels:
+                continue
+            x0 = int(scale * square.x)
+            x1 = int(scale * (square.x + square.side))
+            y0 = int(scale * (ymax - (square.y + square.side)))
+            y1 = int(scale * (ymax - square.y))
+            for tx in range(max(bx0, x0 // tile_size), min(bx1, (x1 - 1) // tile_size + 1)):
+                for ty in range(max(by0, y0 // tile_size), min(by1, (y1 - 1) // tile_size + 1)):
+                    ox = tx * tile_size
+                    oy = ty * tile_size
+                    buckets.setdefault((z, tx, ty), []).append(
+                        (x0 - ox, y0 - oy, x1 - ox, y1 - oy, *color)
+                    )
+
+    jobs = [
+        (os.path.join(directory, str(z), str(tx), f"{ty}.png"), tile_size, boxes)
+        for (z, tx, ty), boxes in buckets.items()
+    ]
+    os.makedirs(directory, exist_ok=True)
+    if workers == 1:
+        for job in jobs:
+            _render_tile(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_render_tile, jobs, chunksize=16):
+                pass
+    with open(os.path.join(directory, "tiles.json"), "w") as fh:
+        json.dump(
+            {
+                "layout": "xyz",
+                "format": "png",
+                "tile_size": tile_size,
+                "levels": levels,
+                "extent": [float(xmax), float(ymax)],
+                "pixels_per_unit": [float(scale) for scale, _ in limits],
+                "tiles": len(jobs),
+            },
+            fh,
+            indent=2,
+        )
+    return len(jobs)